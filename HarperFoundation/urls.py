@@ -18,8 +18,10 @@ from django.contrib import admin
 from django.urls import path
 
 from HarperFoundation.views.health_check import HealthCheckView
+from HarperFoundation.views.metrics import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health-check/', HealthCheckView.as_view(), name='health-check'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,23 @@
+import hmac
+import os
+
+from django.http import Http404, HttpResponse
+
+from base.views import ApplicationBaseAPIView
+from mongo.monitoring import render_metrics
+
+
+class MetricsView(ApplicationBaseAPIView):
+    """
+    Mongo command histograms in the Prometheus text format. Served only when METRICS_TOKEN is set, to scrapes sending
+    `Authorization: Bearer <METRICS_TOKEN>`; the client address proves nothing behind a proxy on the same host.
+    """
+    permission_classes = []
+
+    def get(self, request, *args, **kwargs):
+        token = os.environ.get("METRICS_TOKEN")
+        if not token:
+            raise Http404
+        if not hmac.compare_digest(request.META.get("HTTP_AUTHORIZATION", "").encode(), f"Bearer {token}".encode()):
+            raise Http404
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
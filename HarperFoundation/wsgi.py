@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HarperFoundation.settings')
 
 application = get_wsgi_application()
+
+if os.environ.get('MONGO_WARM_CONNECTIONS'):
+    # connect in the worker before its first request instead of on it
+    from utils.mongo_connection import warm_connections
+
+    warm_connections()
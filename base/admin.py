@@ -1,7 +1,13 @@
+import hashlib
+import logging
+
 from django.contrib import admin
+from django.core.cache import cache
 from django.core.paginator import Paginator
 from django.db import connection
 
+logger = logging.getLogger(__name__)
+
 
 class LargeTablePaginator(Paginator):
     """ Warning: Postgresql only hack
@@ -30,7 +36,51 @@ class LargeTablePaginator(Paginator):
     count = property(_get_count)
 
 
+class MongoEstimatedCountPaginator(Paginator):
+    """
+    Paginator for djongo tables. An unfiltered changelist counts from the collection metadata
+    (estimated_document_count), a filtered one counts at most count_cap rows and caches the result for
+    count_cache_ttl seconds. Pages past count_cap are not linked, the counts are not fit where the exact number matters.
+    """
+    count_cap = 10000
+    count_cache_ttl = 60
+
+    def get_collection(self):
+        """pymongo collection of the model, djongo's connection is the pymongo Database"""
+        connection.ensure_connection()
+        return connection.connection[self.object_list.model._meta.db_table]
+
+    def get_capped_count(self):
+        try:
+            key = "admin-count:" + hashlib.sha256(str(self.object_list.query).encode()).hexdigest()
+        except Exception:  # noqa the query has no SQL form, e.g. an empty __in
+            key = None
+        count = cache.get(key) if key else None
+        if count is None:
+            count = min(len(self.object_list.values_list("pk", flat=True)[:self.count_cap + 1]), self.count_cap)
+            if key:
+                cache.set(key, count, self.count_cache_ttl)
+        return count
+
+    def _get_count(self):
+        if getattr(self, '_count', None) is not None:
+            return self._count  # pylint: disable=E0203
+
+        if not self.object_list.query.where:
+            try:
+                self._count = self.get_collection().estimated_document_count()  # pylint: disable=W0201
+            except Exception:  # noqa
+                logger.exception("Estimated count of %s failed", self.object_list.model._meta.db_table)
+                self._count = self.get_capped_count()  # pylint: disable=W0201
+        else:
+            self._count = self.get_capped_count()  # pylint: disable=W0201
+
+        return self._count
+
+    count = property(_get_count)
+
+
 class BaseAdmin(admin.ModelAdmin):
     show_full_result_count = False
-    paginator = LargeTablePaginator
+    paginator = MongoEstimatedCountPaginator
     list_per_page = 20
@@ -0,0 +1,177 @@
+"""
+DRF authentication with the access tokens of utils.generate_jwt_token. A verified token is kept with its claims until
+its exp, so a client repeating the same token for its 30 minutes pays the HMAC check and claim parse once per worker:
+
+    class VendorViewSet(ApplicationBaseViewSet):
+        authentication_classes = [JWTAuthentication]
+"""
+import hashlib
+import heapq
+import os
+import threading
+import time
+
+import jwt
+from rest_framework import authentication, exceptions
+
+from utils.generate_jwt_token import decode_jwt
+from utils.get_env import get_env_value
+
+DEFAULT_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+# lifetime of the access tokens of generate_access_refresh_token, a user revocation outlives every token it rejects
+ACCESS_TOKEN_LIFETIME_IN_SECONDS = 30 * 60
+
+
+class TokenUser:
+    """request.user of a token request, made from the claims without a database read"""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, claims, user_id_claim="userId"):
+        self.claims = claims
+        self.id = claims.get(user_id_claim)
+
+    @property
+    def token_type(self):
+        return self.claims.get("tokenType")
+
+    def get(self, key, default=None):
+        return self.claims.get(key, default)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class VerifiedTokenCache:
+    """
+    Claims of verified tokens keyed by a digest of the token, dropped at their exp. When full, the entries closest to
+    expiry make room. The denylist applies to cached tokens too: revoke_user rejects the tokens a user got before the
+    revocation, revoke_token_type every token of a type, revoke a single token until it expires. It is per process,
+    revocations have to reach every worker. A user revocation is dropped once the tokens it rejects have expired,
+    after token_lifetime seconds.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, user_id_claim="userId",
+                 token_lifetime=ACCESS_TOKEN_LIFETIME_IN_SECONDS):
+        self.maxsize = maxsize
+        self.user_id_claim = user_id_claim
+        self.token_lifetime = token_lifetime
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._expiry = []
+        self._revoked_users = {}
+        self._revoked_token_types = set()
+        self._revoked_tokens = {}
+
+    @staticmethod
+    def get_key(token, audience):
+        if isinstance(token, str):
+            token = token.encode()
+        return hashlib.sha256(b"%s.%s" % (audience.encode(), token)).digest()
+
+    def get(self, key):
+        entry = self._claims.get(key)
+        if entry is None:
+            return None
+        exp, claims = entry
+        if exp <= time.time():
+            self._claims.pop(key, None)
+            return None
+        if self._revoked_users or self._revoked_token_types or self._revoked_tokens:
+            if self.is_revoked(key, claims):
+                self._claims.pop(key, None)
+                return None
+        return claims
+
+    def set(self, key, claims):
+        exp = claims.get("exp")
+        if exp is None or self.maxsize <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            while self._expiry and (self._expiry[0][0] <= now or len(self._claims) >= self.maxsize):
+                expired_at, expired_key = heapq.heappop(self._expiry)
+                entry = self._claims.get(expired_key)
+                if entry is not None and entry[0] == expired_at:
+                    del self._claims[expired_key]
+            self._claims[key] = (exp, claims)
+            heapq.heappush(self._expiry, (exp, key))
+            for token_key in [token_key for token_key, expires_at in self._revoked_tokens.items() if expires_at <= now]:
+                del self._revoked_tokens[token_key]
+            self.prune_revoked_users(now)
+
+    def prune_revoked_users(self, now):
+        for user_id in [user_id for user_id, revoked_at in self._revoked_users.items()
+                        if revoked_at + self.token_lifetime <= now]:
+            del self._revoked_users[user_id]
+
+    def is_revoked(self, key, claims):
+        if key in self._revoked_tokens or claims.get("tokenType") in self._revoked_token_types:
+            return True
+        revoked_at = self._revoked_users.get(claims.get(self.user_id_claim))
+        # iat is in whole seconds, a token issued in the second of the revocation is kept
+        return revoked_at is not None and claims.get("iat", 0) < revoked_at
+
+    def revoke(self, token, audience, exp):
+        self._revoked_tokens[self.get_key(token, audience)] = exp
+
+    def revoke_user(self, user_id, revoked_at=None):
+        with self._lock:
+            self.prune_revoked_users(time.time())
+            self._revoked_users[user_id] = int(time.time() if revoked_at is None else revoked_at)
+
+    def revoke_token_type(self, token_type):
+        self._revoked_token_types.add(token_type)
+
+    def clear(self):
+        with self._lock:
+            self._claims = {}
+            self._expiry = []
+
+    def __len__(self):
+        return len(self._claims)
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+class JWTAuthentication(authentication.BaseAuthentication):
+    """`Authorization: Bearer <access token>` signed with the JWT_SECRET environment variable"""
+    keyword = "Bearer"
+    audience = "BETTERHALF_ADMIN"
+    token_type = "ACCESS"
+    secret_env = "JWT_SECRET"
+    cache = verified_tokens
+
+    def get_secret(self):
+        return get_env_value(self.secret_env)
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        token = header[1]
+        key = self.cache.get_key(token, self.audience)
+        claims = self.cache.get(key)
+        if claims is None:
+            claims = self.verify(key, token)
+            self.cache.set(key, claims)
+        return TokenUser(claims, self.cache.user_id_claim), token
+
+    def verify(self, key, token):
+        try:
+            claims = decode_jwt(token, self.get_secret(), audience=self.audience)
+        except jwt.ExpiredSignatureError:
+            raise exceptions.AuthenticationFailed("Token has expired.")
+        except jwt.InvalidTokenError:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        if claims.get("tokenType") != self.token_type:
+            raise exceptions.AuthenticationFailed("Invalid token type.")
+        if self.cache.is_revoked(key, claims):
+            raise exceptions.AuthenticationFailed("Token has been revoked.")
+        return claims
+
+    def authenticate_header(self, request):
+        return self.keyword
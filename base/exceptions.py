@@ -34,3 +34,9 @@ class HttpException(APIException):
 
     def __str__(self):
         return self.str  # pragma: no cover
+
+
+class InvalidFilterException(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    error_code = 'invalid_filter'
+    message = 'Invalid filter.'
@@ -1,9 +1,7 @@
-def isfloat(num):
-    try:
-        float(num)
-        return True
-    except ValueError:
-        return False
+import functools
+from dataclasses import dataclass
+
+from base.exceptions import InvalidFilterException
 
 
 MongoKeyMap = {
@@ -13,28 +11,139 @@ MongoKeyMap = {
 }
 
 
-class MongoFilter:
+SEARCH_PARAM = "q"
+OPERATOR_SEPARATOR = "__"
+VALUE_SEPARATOR = ","
 
-    def get_val(self, value):
-        if type(value) == list:
-            return {"$in": value}
-        if isfloat(value):
-            return {"$gt": float(value)}
-        return value
+# query param operator -> mongo operator, eq is written as the bare value
+OPERATORS = {
+    "eq": "$eq",
+    "ne": "$ne",
+    "gt": "$gt",
+    "gte": "$gte",
+    "lt": "$lt",
+    "lte": "$lte",
+    "in": "$in",
+    "nin": "$nin",
+}
+LIST_OPERATORS = {"in": "eq", "nin": "ne"}
+EQUALITY_OPERATORS = frozenset({"eq", "ne", "in", "nin"})
+RANGE_OPERATORS = frozenset({"gt", "gte", "lt", "lte"})
 
-    def get_filter_dict(self) -> dict:
-        """"""
-        # TODO: need to handle errors/edge cases
-        # TODO: skip some filter like page, skip
+
+def to_bool(value):
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValueError(value)
+
+
+@dataclass(frozen=True)
+class FilterField:
+    """
+    Typed definition of a filter query param. `ratings=4` uses the default operator, `ratings__gte=4` an explicit one
+    and `city=Bengaluru,Mysuru` the list form of it.
+    """
+    field: str
+    type: type = str
+    operators: frozenset = EQUALITY_OPERATORS
+    default_operator: str = "eq"
+
+    def parse(self, param, value):
+        try:
+            return to_bool(value) if self.type is bool else self.type(value)
+        except (TypeError, ValueError):
+            raise InvalidFilterException(f"{param}: {value!r} is not a valid {self.type.__name__}")
+
+
+MongoFilterFields = {
+    "id": FilterField(MongoKeyMap["id"]),
+    "city": FilterField(MongoKeyMap["city"]),
+    # `ratings=4` has always meant more than 4, the ratings facet of VendorCollection counts the same way
+    "ratings": FilterField(MongoKeyMap["ratings"], float, EQUALITY_OPERATORS | RANGE_OPERATORS, "gt"),
+}
+
+
+@dataclass(frozen=True)
+class CompiledFilter:
+    """
+    Canonical form of a filter query: sorted (field, operator, value) conditions, list values sorted and deduplicated,
+    single value lists turned into eq/ne. Equivalent queries compile to equal, hashable filters whatever the order of
+    their params and values.
+    """
+    conditions: tuple = ()
+    # the q param, kept out of to_dict()
+    text: str = None
+
+    @property
+    def key(self):
+        return self.conditions, self.text
+
+    def to_dict(self) -> dict:
         _filter = {}
-        for key, value in self.request.query_params.items():
-            valueArray = [x for x in value.split(',')]
-            try:
-                _filter[MongoKeyMap[key]] = self.get_val(valueArray if len(valueArray) > 1 else value)
-            except KeyError:
-                pass
-        print("_filter", _filter)
+        operators = {}
+        for field, operator, value in self.conditions:
+            operators.setdefault(field, {})[OPERATORS[operator]] = list(value) if operator in LIST_OPERATORS else value
+        for field, conditions in operators.items():
+            _filter[field] = conditions["$eq"] if list(conditions) == ["$eq"] else conditions
         return _filter
 
+
+def get_condition(param, value, fields):
+    name, _, operator = param.partition(OPERATOR_SEPARATOR)
+    definition = fields[name]
+    values = value.split(VALUE_SEPARATOR)
+    if not operator:
+        operator = "in" if len(values) > 1 and "in" in definition.operators else definition.default_operator
+    if operator not in definition.operators:
+        raise InvalidFilterException(f"{param}: {name} does not support {operator!r}")
+    if operator not in LIST_OPERATORS:
+        return definition.field, operator, definition.parse(param, value)
+    values = sorted(set(definition.parse(param, item) for item in values))
+    if len(values) == 1:
+        return definition.field, LIST_OPERATORS[operator], values[0]
+    return definition.field, operator, tuple(values)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_filter(params: tuple, fields_key=None) -> CompiledFilter:
+    """params is the sorted tuple of (param, value) pairs, see MongoFilter.get_filter_params"""
+    fields = MongoFilterFields if fields_key is None else dict(fields_key)
+    conditions, text = [], None
+    for param, value in params:
+        if param == SEARCH_PARAM:
+            text = value
+            continue
+        conditions.append(get_condition(param, value, fields))
+    return CompiledFilter(tuple(sorted(set(conditions))), text)
+
+
+class MongoFilter:
+    filter_fields = MongoFilterFields
+
+    def get_filter_params(self) -> tuple:
+        """Filter params of the request in canonical order, other params (page, limit ...) are left out"""
+        return tuple(sorted(
+            (key, value) for key, value in self.request.query_params.items()
+            if key == SEARCH_PARAM or key.partition(OPERATOR_SEPARATOR)[0] in self.filter_fields
+        ))
+
+    def get_compiled_filter(self) -> CompiledFilter:
+        fields_key = None if self.filter_fields is MongoFilterFields else tuple(sorted(self.filter_fields.items()))
+        return compile_filter(self.get_filter_params(), fields_key)
+
+    def get_query_key(self):
+        """Hashable key equal for every request with the same filters"""
+        return self.get_compiled_filter().key
+
+    def get_filter_dict(self) -> dict:
+        """Field conditions only, the search text goes to HelperCollection.search, see get_search_text"""
+        return self.get_compiled_filter().to_dict()
+
+    def get_search_text(self):
+        """Value of the q param: $text is only valid in search(), not in a $geoNear query or next to its own $text"""
+        return self.get_compiled_filter().text
+
 # Valid Sample Query
 # {"address.city": {"$in": ["Bengaluru","Sathanur"]}, "gmapRatings":{"$gt" :4}, "gmapPlaceId": {"$in": ["ChIJdaPRwmgZrjsRutwI3WXRMf8"]}, "isActive":False}
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mongo import MongoDBClient
+from mongo.indexes import check_plans, get_index_specs, sync_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Explains the pipelines of the mongo collection classes and fails on a COLLSCAN, an in memory SORT or a "
+        "$lookup without an index. Meant for a local mongod, the declared indexes are synced there first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connection-string", default="mongodb://localhost:27017/plan_check")
+        parser.add_argument("--no-sync", action="store_true", help="Check against the indexes already on the server")
+
+    def handle(self, *args, **options):
+        client = MongoDBClient(connection_string=options["connection_string"], use_cache=False)
+        if not options["no_sync"]:
+            sync_indexes(client.get_default_database(), get_index_specs())
+        failed = 0
+        for class_name, sample_name, problems in check_plans(client.client):
+            if problems:
+                failed += 1
+                for problem in problems:
+                    self.stdout.write(self.style.ERROR(f"{class_name} {sample_name}: {problem}"))
+            else:
+                self.stdout.write(f"{class_name} {sample_name}: ok")
+        if failed:
+            raise CommandError(f"{failed} pipeline plans need an index")
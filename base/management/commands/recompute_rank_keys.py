@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mongo import MongoDBClient
+from mongo.indexes import get_collection_classes
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored ranking key (MongoCollection.ranking) of every document, after changing the weights"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connection-string", default=os.environ.get("CONNECTION_STRING"))
+
+    def handle(self, *args, **options):
+        if not options["connection_string"]:
+            raise CommandError("Pass --connection-string or set CONNECTION_STRING")
+        client = MongoDBClient(connection_string=options["connection_string"], use_cache=False)
+        done = set()
+        for cls in get_collection_classes():
+            if cls.ranking is None or (cls.collection_name, id(cls.ranking)) in done:
+                continue
+            done.add((cls.collection_name, id(cls.ranking)))
+            collection = client.get_default_database().get_collection(cls.collection_name)
+            result = collection.update_many({}, [cls.ranking.get_stage()])
+            self.stdout.write(f"{cls.collection_name}: {result.modified_count} of {result.matched_count} updated")
@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mongo import MongoDBClient
+from mongo.indexes import get_index_specs, sync_indexes
+
+
+class Command(BaseCommand):
+    help = "Creates the indexes declared on the mongo collection classes (MongoCollection.indexes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connection-string", default=os.environ.get("CONNECTION_STRING"))
+        parser.add_argument("--drop", action="store_true", help="Drop indexes that are not declared")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+
+    def handle(self, *args, **options):
+        if not options["connection_string"]:
+            raise CommandError("Pass --connection-string or set CONNECTION_STRING")
+        client = MongoDBClient(connection_string=options["connection_string"], use_cache=False)
+        report = sync_indexes(
+            client.get_default_database(), get_index_specs(), drop=options["drop"], dry_run=options["dry_run"]
+        )
+        for action, names in report.items():
+            for name in names:
+                self.stdout.write(f"{action}: {name}")
+        if not any(report.values()):
+            self.stdout.write(self.style.SUCCESS("Indexes are in sync"))
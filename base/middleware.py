@@ -0,0 +1,38 @@
+import logging
+import time
+
+from mongo.monitoring import end_request, start_request
+
+logger = logging.getLogger(__name__)
+
+
+class MongoTimingMiddleware:
+    """
+    Rolls up the mongo commands of a request (mongo.monitoring) into a Server-Timing header:
+    one entry per command label (aggregate, aggregate:count, find ...), the conversion time spent in QueryIterator
+    and the total time of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started_at = time.perf_counter()
+        token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = end_request(token)
+        total_ms = (time.perf_counter() - started_at) * 1000
+
+        timings = [
+            f'mongo-{label.replace(":", "-")};dur={item["ms"]:.1f};desc="{item["count"]}x {item["returned"]} docs '
+            f'{item["bytes"]}B"'
+            for label, item in stats.get_summary().items()
+        ]
+        timings.append(f"mongo-convert;dur={stats.convert_ms:.1f}")
+        timings.append(f"total;dur={total_ms:.1f}")
+        response["Server-Timing"] = ", ".join(timings)
+        logger.debug("%s %s: %.1fms, %s mongo commands in %.1fms, conversion %.1fms", request.method, request.path,
+                     total_ms, len(stats.commands), stats.command_ms, stats.convert_ms)
+        return response
@@ -1,5 +1,8 @@
 from dirtyfields import DirtyFieldsMixin
-from django.db import models
+from dirtyfields.dirtyfields import reset_state
+from django.db import connections, models, router
+from django.utils import timezone
+from pymongo import UpdateOne
 
 
 class ApplicationBaseModel(models.Model):
@@ -18,3 +21,69 @@ class ApplicationBaseModel(models.Model):
             update_fields = dirty_fields.keys()
 
         return super().save(force_insert, force_update, using, update_fields)
+
+    def get_update_fields(self):
+        """Names of the fields a save writes: the dirty ones of a DirtyFieldsMixin model, else every loaded field"""
+        if isinstance(self, DirtyFieldsMixin) and not self.get_deferred_fields():
+            check_relationship = getattr(self, 'check_relationship', False)
+            return {self._meta.get_field(name).name for name in self.get_dirty_fields(check_relationship)}
+        deferred = self.get_deferred_fields()
+        return {field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred}
+
+    @classmethod
+    def bulk_save(cls, instances, using=None, batch_size=1000):
+        """
+        Saves changed rows of this model in batches instead of one save() each. Instances are grouped by the set of
+        fields they changed and stamped with one modified_at. On djongo every batch is a single unordered Mongo
+        bulk_write of per row $set updates, on other databases each group is a bulk_update.
+        Instances without changes are skipped, new instances are rejected. Returns the number of rows written.
+        """
+        groups = {}
+        for instance in instances:
+            if instance._state.adding:
+                raise ValueError(f'bulk_save only updates existing rows, {instance!r} is not saved yet')
+            fields = instance.get_update_fields()
+            if fields:
+                groups.setdefault(frozenset(fields | {'modified_at'}), []).append(instance)
+        if not groups:
+            return 0
+
+        using = using or router.db_for_write(cls)
+        connection = connections[using]
+        now = timezone.now()
+        for group in groups.values():
+            for instance in group:
+                instance.modified_at = now
+
+        if connection.vendor == 'djongo':
+            written = cls._bulk_write(groups, connection, batch_size)
+        else:
+            written = sum(cls._default_manager.db_manager(using).bulk_update(group, list(fields), batch_size)
+                          for fields, group in groups.items())
+
+        for fields, group in groups.items():
+            for instance in group:
+                if isinstance(instance, DirtyFieldsMixin):
+                    reset_state(type(instance), instance, update_fields=fields)
+        return written
+
+    @classmethod
+    def _bulk_write(cls, groups, connection, batch_size):
+        """djongo's connection is the pymongo Database, values are prepared the way djongo stores them"""
+        pk = cls._meta.pk
+        requests = []
+        for fields, group in groups.items():
+            model_fields = [cls._meta.get_field(name) for name in fields]
+            for instance in group:
+                requests.append(UpdateOne(
+                    {pk.column: pk.get_db_prep_value(instance.pk, connection)},
+                    {'$set': {field.column: field.get_db_prep_save(getattr(instance, field.attname), connection)
+                              for field in model_fields}}
+                ))
+        connection.ensure_connection()
+        collection = connection.connection[cls._meta.db_table]
+        written = 0
+        for start in range(0, len(requests), batch_size):
+            written += collection.bulk_write(requests[start:start + batch_size], ordered=False).matched_count
+        return written
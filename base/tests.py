@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from base.authentication import VerifiedTokenCache
+from base.exceptions import InvalidFilterException
+from base.filters import FilterField, MongoFilter, compile_filter
+
+
+class CompileFilterTest(SimpleTestCase):
+
+    def test_default_operators(self):
+        compiled = compile_filter((("city", "Pune"), ("ratings", "4")))
+        self.assertEqual(compiled.to_dict(), {"address.city": "Pune", "gmapRatings": {"$gt": 4.0}})
+
+    def test_list_values_are_sorted_and_deduplicated(self):
+        self.assertEqual(compile_filter((("city", "Pune,Mysuru,Pune"),)).to_dict(),
+                         {"address.city": {"$in": ["Mysuru", "Pune"]}})
+        self.assertEqual(compile_filter((("city", "Pune,Pune"),)).to_dict(), {"address.city": "Pune"})
+        self.assertEqual(compile_filter((("city__nin", "Pune"),)).to_dict(), {"address.city": {"$ne": "Pune"}})
+
+    def test_equivalent_queries_compile_equal(self):
+        first = compile_filter((("city", "Pune,Mysuru"), ("ratings__gte", "4")))
+        second = compile_filter((("city__in", "Mysuru,Pune"), ("ratings__gte", "4.0")))
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first.key), hash(second.key))
+
+    def test_range_of_one_field(self):
+        compiled = compile_filter((("ratings__gte", "3"), ("ratings__lt", "4.5")))
+        self.assertEqual(compiled.to_dict(), {"gmapRatings": {"$gte": 3.0, "$lt": 4.5}})
+
+    def test_invalid_params(self):
+        with self.assertRaises(InvalidFilterException):
+            compile_filter((("ratings", "high"),))
+        with self.assertRaises(InvalidFilterException):
+            compile_filter((("city__gt", "Pune"),))
+
+    def test_search_text_is_not_a_condition(self):
+        compiled = compile_filter((("city", "Pune"), ("q", "royal palace")))
+        self.assertEqual(compiled.text, "royal palace")
+        self.assertEqual(compiled.to_dict(), {"address.city": "Pune"})
+
+    def test_custom_fields(self):
+        fields = (("verified", FilterField("isVerified", bool)),)
+        self.assertEqual(compile_filter((("verified", "true"),), fields).to_dict(), {"isVerified": True})
+
+
+class VendorFilter(MongoFilter):
+
+    def __init__(self, query_string):
+        self.request = Request(APIRequestFactory().get(f"/vendors/?{query_string}"))
+
+
+class MongoFilterTest(SimpleTestCase):
+
+    def test_other_params_are_left_out(self):
+        vendor_filter = VendorFilter("page=2&ratings=4&city=Pune&q=royal&limit=10")
+        self.assertEqual(vendor_filter.get_filter_params(), (("city", "Pune"), ("q", "royal"), ("ratings", "4")))
+        self.assertEqual(vendor_filter.get_filter_dict(), {"address.city": "Pune", "gmapRatings": {"$gt": 4.0}})
+        self.assertEqual(vendor_filter.get_search_text(), "royal")
+
+    def test_query_key_ignores_param_order(self):
+        self.assertEqual(VendorFilter("city=Pune,Mysuru&ratings=4").get_query_key(),
+                         VendorFilter("ratings=4.0&city=Mysuru,Pune&page=3").get_query_key())
+
+
+class VerifiedTokenCacheTest(SimpleTestCase):
+    now = 1_700_000_000
+
+    def setUp(self):
+        patcher = mock.patch("base.authentication.time.time", return_value=self.now)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = VerifiedTokenCache(maxsize=2, token_lifetime=1800)
+
+    def claims(self, user_id="u1", iat=None, exp=None, token_type="ACCESS"):
+        iat = self.now - 60 if iat is None else iat
+        return {"userId": user_id, "iat": iat, "exp": iat + 1800 if exp is None else exp, "tokenType": token_type}
+
+    def test_get_until_exp(self):
+        key = self.cache.get_key("token", "AUD")
+        self.assertNotEqual(key, self.cache.get_key("token", "OTHER"))
+        claims = self.claims(exp=self.now + 10)
+        self.cache.set(key, claims)
+        self.assertEqual(self.cache.get(key), claims)
+        self.time.return_value = self.now + 10
+        self.assertIsNone(self.cache.get(key))
+
+    def test_closest_to_expiry_is_evicted(self):
+        self.cache.set(b"a", self.claims(exp=self.now + 300))
+        self.cache.set(b"b", self.claims(exp=self.now + 100))
+        self.cache.set(b"c", self.claims(exp=self.now + 200))
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get(b"b"))
+        self.assertIsNotNone(self.cache.get(b"a"))
+
+    def test_revoke_user(self):
+        self.cache.set(b"old", self.claims(iat=self.now - 60))
+        self.cache.revoke_user("u1")
+        self.assertIsNone(self.cache.get(b"old"))
+        # issued in the second of the revocation, iat has no fraction to tell it apart
+        self.assertFalse(self.cache.is_revoked(b"new", self.claims(iat=self.now)))
+        self.assertFalse(self.cache.is_revoked(b"other", self.claims(user_id="u2")))
+
+    def test_user_revocations_expire_with_the_tokens(self):
+        self.cache.revoke_user("u1", revoked_at=self.now + 0.9)
+        self.assertEqual(self.cache._revoked_users, {"u1": self.now})
+        self.time.return_value = self.now + 1800
+        self.cache.set(b"a", self.claims(user_id="u2", iat=self.now + 1800))
+        self.assertEqual(self.cache._revoked_users, {})
+
+    def test_revoke_token_and_token_type(self):
+        key = self.cache.get_key("token", "AUD")
+        self.cache.set(key, self.claims())
+        self.cache.revoke("token", "AUD", exp=self.now + 100)
+        self.assertIsNone(self.cache.get(key))
+        self.assertFalse(self.cache.is_revoked(b"any", self.claims(token_type="REFRESH")))
+        self.cache.revoke_token_type("REFRESH")
+        self.assertTrue(self.cache.is_revoked(b"any", self.claims(token_type="REFRESH")))
@@ -1,4 +1,26 @@
-from .mongo import MongoDBClient
-from .collection import MongoCollection, QueryIterator
-from .utils import get_random_string
+# Names are imported on first access (PEP 562), so `from mongo import MongoDBClient` does not load the collections
+import importlib
 
+_exports = {
+    "MongoDBClient": ".mongo",
+    "CODEC_OPTIONS": ".codecs",
+    "MongoCollection": ".collection",
+    "QueryIterator": ".collection",
+    "get_random_string": ".utils",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_exports})
@@ -0,0 +1,361 @@
+"""
+asyncio counterparts of the collection classes for async views served through HarperFoundation.asgi.
+They build the same pipelines, audit stamps and codecs as the sync classes and only differ in how the driver is awaited.
+"""
+import asyncio
+import os
+import weakref
+
+from pymongo import AsyncMongoClient
+
+from .collection import QueryIterator, MongoCollection, HelperCollection, VendorCollection, DecorCollection, \
+    PhotographyCollection, NGOCollection
+from .connection import ConnectionManager
+from .enums import CountStrategy, ReadRoute
+from .facets import get_facet_counts
+from .mongo import MongoDBClient
+from .tracking import TrackedDocument
+
+
+class AsyncConnectionManager(ConnectionManager):
+    """
+    AsyncMongoClient is bound to the event loop it first runs on, so clients are kept per running loop, weakly keyed
+    by the loop. A client that connected holds its loop, so the clients of closed loops are dropped as well when the
+    next loop makes its first client.
+    """
+
+    def __init__(self):
+        super().__init__(client_class=AsyncMongoClient)
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _after_fork(self):
+        super()._after_fork()
+        self._loops = weakref.WeakKeyDictionary()
+
+    def get_store(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return super().get_store()
+        store = self._loops.get(loop)
+        if store is None:
+            with self._lock:
+                for closed_loop in [other for other in list(self._loops.keys()) if other.is_closed()]:
+                    del self._loops[closed_loop]
+                store = self._loops.setdefault(loop, ({}, {}))
+        return store
+
+    def get_stores(self):
+        return [*super().get_stores(), *list(self._loops.values())]
+
+    async def close_all(self):
+        """Closes the clients of the running loop and the ones made outside a loop"""
+        pid = os.getpid()
+        stores = [super().get_store(), self.get_store()]
+        clients = []
+        with self._lock:
+            for store_clients, store_listeners in stores:
+                for key in [key for key in store_clients if key[2] == pid]:
+                    clients.append(store_clients.pop(key))
+                    store_listeners.pop(key, None)
+        for client in clients:
+            await client.close()
+
+
+async_connection_manager = AsyncConnectionManager()
+
+
+class AsyncClientMixin:
+    connection_manager = async_connection_manager
+    client_class = AsyncMongoClient
+
+    def __del__(self):
+        # AsyncMongoClient.close is a coroutine and can not be awaited here, uncached clients are closed by the caller
+        self._default_db = None
+        self._client = None
+
+
+class AsyncMongoDBClient(AsyncClientMixin, MongoDBClient):
+    pass
+
+
+class AsyncListCursor:
+    """Async iteration over rows that are already in memory, e.g. the data branch of a $facet"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncQueryIterator(QueryIterator):
+
+    def __iter__(self):
+        raise TypeError("AsyncQueryIterator must be consumed with `async for`")
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return self.process(await anext(self.cursor))
+
+    @property
+    def size(self):
+        if self._size is None and self.size_function is not None:
+            raise TypeError("with_size=True is counted with `await get_size()`")
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        self._size = value
+
+    async def get_size(self):
+        """The total of with_size=True, counted once on the first call"""
+        if self._size is None and self.size_function is not None:
+            self._size = await self.size_function()
+            self.size_function = None
+        return self._size
+
+    def prefetch(self, batch_size=100, max_batches=2):
+        """Nothing to do, the event loop already overlaps reading the cursor with the caller's work"""
+        return self
+
+    async def close(self):
+        """The driver's async cursors close with a coroutine, rows already in memory have nothing to close"""
+        if hasattr(self.cursor, "close"):
+            await self.cursor.close()
+
+    async def to_list(self):
+        return [data async for data in self]
+
+
+class AsyncMongoCollection(AsyncClientMixin, MongoCollection):
+
+    async def insert_one(self, *, document, action_by=None, **kwargs):
+        if not document:
+            return
+        result = await self.collection.insert_one(
+            **self.with_session(self.get_insert_one_kwargs(document=document, action_by=action_by, **kwargs))
+        )
+        self.bump_version()
+        return result
+
+    async def insert_many(self, *, documents, action_by=None, **kwargs):
+        result = await self.collection.insert_many(
+            **self.with_session(self.get_insert_many_kwargs(documents=documents, action_by=action_by, **kwargs))
+        )
+        self.bump_version()
+        return result
+
+    def find(self, *args, raw=False, tracked=False, read_route=None, **kwargs):
+        return AsyncQueryIterator(
+            self.get_collection(raw, read_route).find(*args, **self.with_session(kwargs)),
+            self.get_convertor(raw, tracked)
+        )
+
+    async def find_one(self, *args, tracked=False, **kwargs):
+        result = await self.collection.find_one(*args, **self.with_session(kwargs))
+        if result is not None and tracked:
+            result = TrackedDocument(result)
+        return result
+
+    async def update_one(self, *, update, unset=None, action_by=None, push=None, **kwargs):
+        update_kwargs = self.with_session(
+            self.get_update_one_kwargs(update=update, unset=unset, action_by=action_by, push=push, **kwargs)
+        )
+        result = await self.collection.update_one(**update_kwargs)
+        if self.needs_rank_refresh(update_kwargs):
+            await self.collection.update_one(update_kwargs["filter"], [self.ranking.get_stage()],
+                                             session=update_kwargs["session"])
+        self.bump_version()
+        return result
+
+    async def update_many(self, *, update, set_on_insert=None, action_by=None, **kwargs):
+        update_kwargs = self.with_session(self.get_update_many_kwargs(
+            update=update, set_on_insert=set_on_insert, action_by=action_by, **kwargs
+        ))
+        result = await self.collection.update_many(**update_kwargs)
+        if self.needs_rank_refresh(update_kwargs):
+            await self.collection.update_many(update_kwargs["filter"], [self.ranking.get_stage()],
+                                              session=update_kwargs["session"])
+        self.bump_version()
+        return result
+
+    async def save_changes(self, *, document, filter=None, action_by=None, **kwargs):
+        update_kwargs = self.get_save_changes_kwargs(document=document, filter=filter, action_by=action_by, **kwargs)
+        if update_kwargs is None:
+            return
+        result = await self.collection.update_one(**self.with_session(update_kwargs))
+        self.bump_version()
+        self.mark_saved(document, update_kwargs)
+        return result
+
+
+class AsyncHelperCollection(AsyncMongoCollection, HelperCollection):
+
+    def find(
+            self,
+            *args,
+            defaults: dict = None,
+            sort_by: dict = None,
+            page: int = 1,
+            limit: int = 10,
+            raw: bool = False,
+            tracked: bool = False,
+            after: str = None,
+            with_size: bool = False,
+            read_route: ReadRoute = None,
+            **kwargs,
+    ):
+        """with_size=True lets `await get_size()` count the matching documents, once and only when asked"""
+        size_function = self.get_size_function(args, kwargs, defaults, read_route) if with_size else None
+        return AsyncQueryIterator(
+            self.get_find_cursor(*args, defaults=defaults, sort_by=sort_by, page=page, limit=limit, raw=raw,
+                                 after=after, read_route=read_route, **kwargs),
+            self.get_convertor(raw, tracked), sort_fields=list(self.get_find_sort(sort_by)), limit=limit,
+            size_function=size_function
+        )
+
+    async def aggregate_count(self, defaults: [dict] = None, read_route: ReadRoute = None):
+        cursor = await self.get_collection(read_route=read_route).aggregate(
+            self.get_count_pipeline(defaults), comment="count", session=self.get_session()
+        )
+        return self.get_count_from_result(await cursor.to_list())
+
+    async def get_count(self, matches, count_strategy, read_route=None):
+        if count_strategy == CountStrategy.NONE:
+            return None
+        if count_strategy == CountStrategy.ESTIMATED:
+            return await self.get_collection(read_route=read_route).estimated_document_count(
+                session=self.get_session()
+            )
+        if count_strategy == CountStrategy.CACHED:
+            key = self.get_count_cache_key(matches)
+            size = self.count_cache.get(key)
+            if size is None:
+                size = await self.aggregate_count(matches, read_route)
+                self.count_cache.set(key, size, self.count_cache_ttl)
+            return size
+        return await self.aggregate_count(matches, read_route)
+
+    async def aggregate_page(self, filter_list, matches, count_strategy=None, raw=False, with_count=True,
+                             read_route=None):
+        collection = self.get_collection(raw, read_route)
+        session = self.get_session()
+        strategy = self.get_count_strategy(count_strategy, matches) if with_count else CountStrategy.NONE
+        facet_pipeline = self.get_facet_pipeline(filter_list) if strategy == CountStrategy.FACET else None
+        if facet_pipeline is not None:
+            cursor = await collection.aggregate(facet_pipeline, session=session)
+            result = await cursor.to_list(1)
+            data, size = self.get_facet_result(result[0] if result else None)
+            return AsyncListCursor(data), size
+        if strategy == CountStrategy.FACET:
+            strategy = CountStrategy.EXACT
+        if session is not None:
+            # operations of one session can not run concurrently
+            return await collection.aggregate(filter_list, session=session), await self.get_count(
+                matches, strategy, read_route
+            )
+        # the page query and the count are independent round trips
+        return await asyncio.gather(collection.aggregate(filter_list), self.get_count(matches, strategy, read_route))
+
+    async def search(
+            self,
+            text: str,
+            defaults: [dict] = None,
+            page: int = 1,
+            limit: int = 10,
+            raw: bool = False,
+            count_strategy: CountStrategy = None,
+            read_route: ReadRoute = None
+    ):
+        filter_list, matches = self.get_search_pipeline(text, defaults, page, limit)
+        cursor, size = await self.aggregate_page(filter_list, matches, count_strategy, raw, with_count=page == 1,
+                                                 read_route=read_route)
+        return AsyncQueryIterator(cursor, self.get_convertor(raw), size)
+
+    async def aggregate_near(
+            self,
+            longitude: float,
+            latitude: float,
+            max_distance_in_meters: float = None,
+            defaults: [dict] = None,
+            page: int = 1,
+            limit: int = 10,
+            raw: bool = False,
+            count_strategy: CountStrategy = None,
+            read_route: ReadRoute = None
+    ):
+        filter_list, count_matches = self.get_near_pipeline(
+            longitude, latitude, max_distance_in_meters, defaults, page, limit
+        )
+        cursor, size = await self.aggregate_page(
+            filter_list, count_matches, self.get_near_count_strategy(count_strategy, count_matches), raw,
+            with_count=page == 1, read_route=read_route
+        )
+        return AsyncQueryIterator(cursor, self.get_convertor(raw), size)
+
+
+class AsyncVendorCollection(AsyncHelperCollection, VendorCollection):
+
+    async def aggregate(
+            self,
+            defaults: [dict] = None,
+            sort_by: dict = None,
+            page: int = 1,
+            limit: int = 10,
+            vendor_id_list=None,
+            raw: bool = False,
+            after: str = None,
+            count_strategy: CountStrategy = None,
+            read_route: ReadRoute = None
+    ):
+        cache_key = cached = None
+        if self.result_cache is not None:
+            cache_key = self.get_result_cache_key(defaults, sort_by, page, limit, vendor_id_list, after, count_strategy)
+            cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            rows, size = self.decode_page(cached, raw)
+            cursor = AsyncListCursor(rows)
+        else:
+            filter_list, matches = self.get_aggregate_pipeline(defaults, sort_by, page, limit, vendor_id_list, after)
+            cursor, size = await self.aggregate_page(filter_list, matches, count_strategy, raw,
+                                                     with_count=page == 1 and not after, read_route=read_route)
+            if cache_key is not None:
+                data = self.encode_page([row async for row in cursor], size)
+                self.result_cache.set(cache_key, data)
+                rows, size = self.decode_page(data, raw)
+                cursor = AsyncListCursor(rows)
+        return AsyncQueryIterator(cursor, self.get_convertor(raw), size, sort_fields=list(self.get_sort_spec(sort_by)),
+                                  limit=self.get_limit_value(limit))
+
+    async def facet_counts(self, filters: dict = None, defaults: [dict] = None, read_route: ReadRoute = None):
+        key = self.get_facet_cache_key(filters, defaults)
+        counts = self.facet_cache.get(key)
+        if counts is None:
+            cursor = await self.get_collection(read_route=read_route).aggregate(
+                self.get_facet_pipeline_for_filters(filters, defaults), session=self.get_session()
+            )
+            result = await cursor.to_list(1)
+            counts = get_facet_counts(self.facet_config, result[0] if result else None)
+            self.facet_cache.set(key, counts)
+        return counts
+
+
+class AsyncDecorCollection(AsyncVendorCollection, DecorCollection):
+    pass
+
+
+class AsyncPhotographyCollection(AsyncVendorCollection, PhotographyCollection):
+    pass
+
+
+class AsyncNGOCollection(AsyncHelperCollection, NGOCollection):
+    pass
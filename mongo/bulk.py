@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+import bson
+from pymongo.errors import BulkWriteError
+
+from .codecs import CODEC_OPTIONS
+from .data_operation import MongoOperationDataClass
+from .enums import MongoOperations
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BulkWriteReport:
+    inserted: int = 0
+    matched: int = 0
+    modified: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    # (MongoOperationDataClass, write error from the server) for every operation that failed
+    errors: list = field(default_factory=list)
+
+    def add(self, other):
+        self.inserted += other.inserted
+        self.matched += other.matched
+        self.modified += other.modified
+        self.upserted += other.upserted
+        self.deleted += other.deleted
+        self.errors.extend(other.errors)
+
+
+class BulkWriter:
+    """
+    Queues writes on a MongoCollection and sends them as unordered bulk_write batches. A batch is flushed once it
+    holds max_operations operations or max_bytes of BSON, when an operation is queued max_delay_in_seconds after the
+    oldest queued one, and on leaving the `with` block. Audit stamps are applied when the operation is queued.
+    An update of a ranking signal that has no pipeline form queues a rankKey refresh, sent after its batch since the
+    batch itself is unordered.
+
+        with vendor_leads.bulk_writer(action_by=admin_id) as writer:
+            for lead_id, status in updates:
+                writer.update_one(filter={"leadId": lead_id}, update={"leadStatus": status})
+        writer.report.errors
+    """
+
+    def __init__(self, collection, *, max_operations=1000, max_bytes=8 * 1024 * 1024, max_delay_in_seconds=1.0,
+                 action_by=None):
+        self.collection = collection
+        self.max_operations = max_operations
+        self.max_bytes = max_bytes
+        self.max_delay_in_seconds = max_delay_in_seconds
+        self.action_by = action_by
+        self.report = BulkWriteReport()
+        self._lock = threading.RLock()
+        self._operations = []
+        self._refreshes = []
+        self._bytes = 0
+        self._first_queued_at = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        elif self._operations:
+            logger.warning("Dropping %s queued writes on %s after %r", len(self._operations),
+                           self.collection.collection.name, exc_val)
+
+    def _get_operation(self, operation_name, operation_params):
+        return MongoOperationDataClass(
+            collection=self.collection.collection, operation_name=operation_name, operation_params=operation_params
+        )
+
+    def _queue(self, operation_name, operation_params):
+        operation = self._get_operation(operation_name, operation_params)
+        refresh = None
+        if operation_name in (MongoOperations.UPDATE_ONE, MongoOperations.UPDATE_MANY) and \
+                self.collection.needs_rank_refresh(operation_params):
+            refresh = self._get_operation(operation_name, {
+                "filter": operation_params["filter"], "update": [self.collection.ranking.get_stage()]
+            })
+        size = len(bson.encode(operation_params, codec_options=CODEC_OPTIONS))
+        with self._lock:
+            if self._operations and self._bytes + size > self.max_bytes:
+                self.flush()
+            if not self._operations:
+                self._first_queued_at = time.monotonic()
+            self._operations.append(operation)
+            if refresh is not None:
+                self._refreshes.append(refresh)
+            self._bytes += size
+            if len(self._operations) >= self.max_operations or \
+                    time.monotonic() - self._first_queued_at >= self.max_delay_in_seconds:
+                self.flush()
+        return operation
+
+    def insert_one(self, *, document, action_by=None):
+        return self._queue(MongoOperations.INSERT_ONE, self.collection.get_insert_one_kwargs(
+            document=document, action_by=action_by or self.action_by
+        ))
+
+    def update_one(self, *, filter, update, unset=None, push=None, action_by=None, upsert=False):
+        return self._queue(MongoOperations.UPDATE_ONE, self.collection.get_update_one_kwargs(
+            filter=filter, update=update, unset=unset, push=push, action_by=action_by or self.action_by, upsert=upsert
+        ))
+
+    def update_many(self, *, filter, update, action_by=None, upsert=False):
+        return self._queue(MongoOperations.UPDATE_MANY, self.collection.get_update_many_kwargs(
+            filter=filter, update=update, action_by=action_by or self.action_by, upsert=upsert
+        ))
+
+    def delete_one(self, *, filter):
+        return self._queue(MongoOperations.DELETE_ONE, {"filter": filter})
+
+    def delete_many(self, *, filter):
+        return self._queue(MongoOperations.DELETE_MANY, {"filter": filter})
+
+    def _write(self, operations):
+        try:
+            details = self.collection.collection.bulk_write(
+                [operation.get_request() for operation in operations], ordered=False
+            ).bulk_api_result
+        except BulkWriteError as exc:
+            details = exc.details
+        for error in details.get("writeConcernErrors", []):
+            logger.error("Write concern error on %s: %s", self.collection.collection.name, error)
+        return details, [(operations[error["index"]], error) for error in details.get("writeErrors", [])]
+
+    def flush(self):
+        """Sends the queued operations, returns the report of this batch (self.report accumulates all of them)"""
+        with self._lock:
+            operations, self._operations = self._operations, []
+            refreshes, self._refreshes = self._refreshes, []
+            self._bytes = 0
+            self._first_queued_at = None
+            if not operations:
+                return BulkWriteReport()
+            details, errors = self._write(operations)
+            if refreshes:
+                # only the failures of the rankKey refreshes are reported, their counts repeat the updates'
+                errors.extend(self._write(refreshes)[1])
+            self.collection.bump_version()
+            report = BulkWriteReport(
+                inserted=details.get("nInserted", 0),
+                matched=details.get("nMatched", 0),
+                modified=details.get("nModified", 0),
+                upserted=details.get("nUpserted", 0),
+                deleted=details.get("nRemoved", 0),
+                errors=errors,
+            )
+            self.report.add(report)
+            return report
@@ -0,0 +1,227 @@
+import abc
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import bson
+
+from .codecs import CODEC_OPTIONS
+
+
+def normalize_query(value):
+    """Same query with dict keys in a different order gives the same value"""
+    if isinstance(value, dict):
+        return {key: normalize_query(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [normalize_query(item) for item in value]
+    return value
+
+
+def get_query_key(*parts):
+    return hashlib.sha256(
+        bson.encode({"q": normalize_query(list(parts))}, codec_options=CODEC_OPTIONS)
+    ).hexdigest()
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache whose entries also expire after a ttl (per entry or the cache default).
+    With max_bytes and get_size the total size of the values is bounded as well.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, max_bytes=None, get_size=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value, size = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = self.get_size(value) if self.get_size else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.monotonic() + ttl, value, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        self._bytes -= self._data.pop(key)[2]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    @property
+    def size_in_bytes(self):
+        return self._bytes
+
+
+class CollectionVersions:
+    """
+    Write counter per collection. Result cache keys include the versions of the collections a result was read from,
+    so a write through MongoCollection makes every older entry unreachable.
+    The counters live in this process only: a write in one worker would not invalidate what the others cached, so they
+    can not back a result cache unless single_process=True says this process is the only one serving (runserver,
+    tests). DjangoCollectionVersions over a shared cache backend works across workers.
+    """
+
+    def __init__(self, single_process=False):
+        self.single_process = single_process
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    @property
+    def shared(self):
+        """True when every process serving requests sees the same counters"""
+        return self.single_process
+
+    def get_many(self, names):
+        return [self._versions.get(name, 0) for name in names]
+
+    def bump(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class DjangoCollectionVersions:
+    """Versions kept in a Django cache, so a write in one worker invalidates the results cached by every worker"""
+
+    def __init__(self, alias="default", prefix="mongo-version:"):
+        self.alias = alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    @property
+    def shared(self):
+        """False for the per process LocMemCache (Django's default without CACHES) and for DummyCache"""
+        from django.core.cache.backends.dummy import DummyCache
+        from django.core.cache.backends.locmem import LocMemCache
+        return not isinstance(self.cache, (DummyCache, LocMemCache))
+
+    def get_many(self, names):
+        versions = self.cache.get_many([self.prefix + name for name in names])
+        return [versions.get(self.prefix + name, 0) for name in names]
+
+    def bump(self, name):
+        key = self.prefix + name
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, timeout=None):
+                self.cache.incr(key)
+
+
+collection_versions = CollectionVersions()
+
+
+def get_collection_versions():
+    return collection_versions
+
+
+def set_collection_versions(versions):
+    global collection_versions
+    collection_versions = versions
+
+
+def get_result_cache_versions():
+    """
+    The collection versions, when a result cache can rely on them. Per process versions would let one worker serve
+    pages another worker's write made stale, that is refused instead, e.g. in settings:
+
+        set_collection_versions(DjangoCollectionVersions(alias="default"))  # with CACHES on redis or memcached
+    """
+    if not collection_versions.shared:
+        raise RuntimeError(
+            "result_cache needs collection versions shared by every worker, see mongo.cache.set_collection_versions"
+        )
+    return collection_versions
+
+
+class ResultCache(abc.ABC):
+    """Backend interface of the query result cache, values are bytes"""
+
+    @abc.abstractmethod
+    def get(self, key):
+        pass
+
+    @abc.abstractmethod
+    def set(self, key, value):
+        pass
+
+
+class LocalResultCache(ResultCache):
+    """Per process LRU with a ttl, bounded by entries and by total bytes"""
+
+    def __init__(self, maxsize=512, ttl=60, max_bytes=64 * 1024 * 1024):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, max_bytes=max_bytes, get_size=len)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+
+class DjangoResultCache(ResultCache):
+    """Results shared through a Django cache backend, entries above max_item_bytes are not stored"""
+
+    def __init__(self, alias="default", ttl=60, max_item_bytes=1024 * 1024, prefix="mongo-result:"):
+        self.alias = alias
+        self.ttl = ttl
+        self.max_item_bytes = max_item_bytes
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key)
+
+    def set(self, key, value):
+        if len(value) <= self.max_item_bytes:
+            self.cache.set(self.prefix + key, value, timeout=self.ttl)
@@ -0,0 +1,48 @@
+import os
+from datetime import datetime, date
+from decimal import Decimal
+
+from bson import Decimal128
+from bson.codec_options import CodecOptions, TypeCodec, TypeEncoder, TypeRegistry
+
+from .utils import IST
+
+# bson encodes datetime natively, so a TypeEncoder never sees it and the tz-naive check can not live in the
+# encoder. validate_document runs it as a read-only scan (no copy of the document), MONGO_VALIDATE_DATETIMES=false
+# turns it off.
+VALIDATE_DATETIMES = os.environ.get("MONGO_VALIDATE_DATETIMES", "true").lower() in ("1", "true", "yes")
+
+
+class DecimalCodec(TypeCodec):
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, value):
+        return Decimal128(value)
+
+    def transform_bson(self, value):
+        return value.to_decimal()
+
+
+class DateEncoder(TypeEncoder):
+    python_type = date
+
+    def transform_python(self, value):
+        return datetime(year=value.year, month=value.month, day=value.day)
+
+
+TYPE_REGISTRY = TypeRegistry([DecimalCodec(), DateEncoder()])
+
+CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=IST, type_registry=TYPE_REGISTRY)
+
+
+def assert_tz_aware(data):
+    """Raise for tz-naive datetimes without rebuilding the document"""
+    if isinstance(data, dict):
+        for value in data.values():
+            assert_tz_aware(value)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            assert_tz_aware(value)
+    elif isinstance(data, datetime) and data.tzinfo is None:
+        raise Exception("Timezone unaware datetime object is passed to Mongo")
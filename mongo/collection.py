@@ -1,32 +1,128 @@
+import contextvars
+import functools
 import os
+import queue
+import threading
+import time
+import weakref
 from datetime import datetime
 
-from bson.codec_options import CodecOptions
+import bson
+from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
 
-from filters.constant import sort_key_map
+from .bulk import BulkWriter
+from .cache import TTLCache, get_collection_versions, get_query_key, get_result_cache_versions
+from .codecs import CODEC_OPTIONS, VALIDATE_DATETIMES, assert_tz_aware
+from .enums import CountStrategy, ReadRoute
+from .facets import get_facet_counts, get_facet_stage
+from .indexes import IndexSpec
 from .mongo import MongoDBClient
+from .monitoring import record_conversion
+from .pagination import SORT_KEY_FIELD, decode_cursor, encode_cursor, get_keyset_match, get_value
+from .ranking import RankingEngine, get_set_fields
+from .routing import MAX_STALENESS_SECONDS, get_read_preference, get_session
+from .raw import RAW_CODEC_OPTIONS, LazyDocument
+from .tracking import TrackedDocument
 from .utils import IST
 
 BUCKET = os.environ.get("BUCKET_NAME", "bh_dev_bucket")
 GCP_CDN_URL = os.environ.get("GCP_CDN_URL", "https://weddingimage.betterhalf.ai")
 URL_PREFIX = GCP_CDN_URL + "/"
+EARTH_RADIUS_IN_METERS = 6378100
 
 
 class QueryIterator:
-    def __init__(self, cursor, convertor_function, size=None):
+    """
+    Converted rows of a cursor. size is the total when it was counted with the query, size_function counts it
+    lazily on the first read of size. There is no len(): list() would take the total as its length hint, counting
+    and preallocating for the whole collection. prefetch() moves reading and converting the cursor to a background thread.
+    """
+
+    def __init__(self, cursor, convertor_function=None, size=None, sort_fields=None, limit=None, size_function=None):
         self.cursor = cursor
         self.convertor_function = convertor_function
-        self.size = size
+        self._size = size
+        self.size_function = size_function
+        self.sort_fields = sort_fields
+        self.limit = limit
+        self.count = 0
+        self.last_sort_key = None
+        self._prefetcher = None
+
+    @property
+    def size(self):
+        if self._size is None and self.size_function is not None:
+            self._size = self.size_function()
+            self.size_function = None
+        return self._size
+
+    @size.setter
+    def size(self, value):
+        self._size = value
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        data = next(self.cursor)
-        data = self.convertor_function(data)
+        if self._prefetcher is not None:
+            return self.track(next(self._prefetcher))
+        return self.process(next(self.cursor))
+
+    def prefetch(self, batch_size=100, max_batches=2):
+        """
+        Reads and converts the next rows in a background thread while the caller consumes the current ones.
+        At most max_batches batches of batch_size converted rows wait in memory. Call before iterating.
+        """
+        if self._prefetcher is None and self.count == 0:
+            self._prefetcher = Prefetcher(self.cursor, self.convert, batch_size, max_batches)
+        return self
+
+    def close(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+        elif hasattr(self.cursor, "close"):
+            self.cursor.close()
+
+    def fetch(self):
+        """Reads the rest of the cursor now, the rows are still converted as they are iterated"""
+        if self._prefetcher is None and isinstance(self.cursor, (Cursor, CommandCursor)):
+            self.cursor = iter(list(self.cursor))
+        return self
+
+    def process(self, data):
+        return self.track(self.convert(data))
+
+    def convert(self, data):
+        started_at = time.perf_counter()
+        if self.convertor_function is not None:
+            data = self.convertor_function(data)
         self.update_media_url(data)
+        record_conversion(time.perf_counter() - started_at)
+        return data
+
+    def track(self, data):
+        self.update_sort_key(data)
+        self.count += 1
         return data
 
+    def update_sort_key(self, data):
+        if self.sort_fields is None:
+            return
+        if SORT_KEY_FIELD in data:
+            self.last_sort_key = data.pop(SORT_KEY_FIELD)
+        else:
+            self.last_sort_key = [get_value(data, field) for field in self.sort_fields]
+
+    @property
+    def next_cursor(self):
+        """Token for the page after the rows read so far, None once a short page shows there is nothing left"""
+        if self.last_sort_key is None:
+            return None
+        if self.limit is not None and self.count < self.limit:
+            return None
+        return encode_cursor(self.sort_fields, self.last_sort_key)
+
     def update_media_url(self, data):
         """"""
         try:
@@ -35,31 +131,170 @@ class QueryIterator:
             pass
 
 
+def read_batches(cursor, convert, batches, stop, batch_size):
+    """
+    Body of the Prefetcher thread. It holds no reference to the Prefetcher or its QueryIterator (convert is a
+    WeakMethod when it is bound), so an abandoned iterator is collected, which sets stop and ends the thread.
+    """
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        batch = []
+        for data in cursor:
+            function = convert() if isinstance(convert, weakref.WeakMethod) else convert
+            if function is None:
+                stop.set()
+                return
+            batch.append(function(data))
+            function = None
+            if len(batch) >= batch_size:
+                if not put(batch):
+                    return
+                batch = []
+        if batch:
+            put(batch)
+        put(Prefetcher.done)
+    except BaseException as exc:
+        put(exc)
+    finally:
+        if stop.is_set() and hasattr(cursor, "close"):
+            cursor.close()
+
+
+class Prefetcher:
+    """Background reader of a cursor for QueryIterator.prefetch, runs in a copy of the caller's context"""
+    done = object()
+
+    def __init__(self, cursor, convert, batch_size=100, max_batches=2):
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_batches)
+        self._stop = threading.Event()
+        self._batch = iter(())
+        self._finished = False
+        if hasattr(convert, "__self__"):
+            convert = weakref.WeakMethod(convert)
+        # the thread stops, and closes the cursor, once nobody holds this prefetcher any more
+        weakref.finalize(self, self._stop.set)
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(read_batches, cursor, convert, self._queue, self._stop, batch_size),
+            daemon=True, name="query-prefetch"
+        )
+        self._thread.start()
+
+    def __next__(self):
+        for data in self._batch:
+            return data
+        if self._finished:
+            raise StopIteration
+        item = self._queue.get()
+        if item is self.done:
+            self._finished = True
+            raise StopIteration
+        if isinstance(item, BaseException):
+            self._finished = True
+            raise item
+        self._batch = iter(item)
+        return next(self)
+
+    def close(self):
+        """Stops the reader, e.g. when the caller stops iterating early"""
+        self._stop.set()
+        self._finished = True
+
+
 class MongoCollection(MongoDBClient):
     # PerPageLimit = 0  # No limit
     MaxPerPageLimit = 30
+    # Collection the class reads by default and the IndexSpecs its queries need, see manage.py sync_mongo_indexes
+    collection_name = None
+    indexes = ()
+    # mongo.ranking.RankingEngine whose key is kept up to date by the write methods
+    ranking = None
+    # Where listing and count reads go, see mongo.routing. Writes and find_one always use the primary
+    read_route = ReadRoute.PRIMARY
+    max_staleness_seconds = MAX_STALENESS_SECONDS
 
     # Page = 1
 
-    def __init__(self, *, collection_name, **kwargs):
+    def __init__(self, *, collection_name=None, **kwargs):
         super(MongoCollection, self).__init__(**kwargs)
-        self.collection = self._default_db.get_collection(collection_name).with_options(
-            CodecOptions(tz_aware=True, tzinfo=IST)
-        )
+        self.collection = self._default_db.get_collection(
+            collection_name or self.collection_name
+        ).with_options(CODEC_OPTIONS)
+        self._raw_collection = None
+        self._routed_collections = {}
+
+    def get_plan_samples(self):
+        """(name, pipeline) pairs that manage.py check_mongo_plans explains"""
+        return []
+
+    def get_collection(self, raw=False, read_route=None):
+        """
+        With raw=True documents come back as RawBSONDocument and are wrapped in LazyDocument.
+        read_route overrides the read_route of the class.
+        """
+        collection = self.collection
+        if raw:
+            if self._raw_collection is None:
+                self._raw_collection = self.collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+            collection = self._raw_collection
+        read_route = ReadRoute(read_route or self.read_route)
+        if read_route == ReadRoute.PRIMARY:
+            return collection
+        key = (raw, read_route)
+        if key not in self._routed_collections:
+            self._routed_collections[key] = collection.with_options(
+                read_preference=get_read_preference(read_route, self.max_staleness_seconds)
+            )
+        return self._routed_collections[key]
 
-    def insert_one(self, *, document, action_by=None, **kwargs):
-        if not document:
-            return
+    def get_session(self):
+        """The causal session of the current context on this client, see mongo.routing.causal_session"""
+        return get_session(self._client)
+
+    def with_session(self, kwargs):
+        kwargs.setdefault("session", self.get_session())
+        return kwargs
+
+    @staticmethod
+    def get_convertor(raw=False, tracked=False):
+        if raw and tracked:
+            raise ValueError("raw and tracked documents can not be combined")
+        if raw:
+            return LazyDocument
+        if tracked:
+            return TrackedDocument
+        return None
+
+    @staticmethod
+    def validate_document(data):
+        """Decimal and date are converted by the codecs in CODEC_OPTIONS, only the tz check remains"""
+        if VALIDATE_DATETIMES:
+            assert_tz_aware(data)
+        return data
+
+    def get_insert_one_kwargs(self, *, document, action_by=None, **kwargs):
         audit_stamp = datetime.now(IST)
         document["createdAt"] = audit_stamp
         document["updatedAt"] = audit_stamp
         if action_by is not None:
             document["createdBy"] = action_by
             document["updatedBy"] = action_by
-        kwargs["document"] = self.python_to_bson(document)
-        return self.collection.insert_one(**kwargs)
+        if self.ranking is not None:
+            document[self.ranking.field] = self.ranking.compute(document)
+        kwargs["document"] = self.validate_document(document)
+        return kwargs
 
-    def insert_many(self, *, documents, action_by=None, **kwargs):
+    def get_insert_many_kwargs(self, *, documents, action_by=None, **kwargs):
         audit_stamp = datetime.now(IST)
         document_list = []
         for doc in documents:
@@ -68,40 +303,132 @@ class MongoCollection(MongoDBClient):
             if action_by is not None:
                 doc["createdBy"] = action_by
                 doc["updatedBy"] = action_by
+            if self.ranking is not None:
+                doc[self.ranking.field] = self.ranking.compute(doc)
             document_list.append(doc)
-        kwargs["documents"] = self.python_to_bson(document_list)
-        return self.collection.insert_many(**kwargs)
-
-    def find(self, *args, **kwargs):
-        return QueryIterator(self.collection.find(*args, **kwargs), self.bson_to_python)
+        kwargs["documents"] = self.validate_document(document_list)
+        return kwargs
 
-    def find_one(self, *args, **kwargs):
-        result = self.collection.find_one(*args, **kwargs)
-        if result is not None:
-            result = self.bson_to_python(result)
-        return result
-
-    def update_one(self, *, update, unset=None, action_by=None, push=None, **kwargs):
+    def get_update_one_kwargs(self, *, update, unset=None, action_by=None, push=None, **kwargs):
         update["updatedAt"] = datetime.now(IST)
         if action_by is not None:
             update["updatedBy"] = action_by
-        update = self.python_to_bson(update)
+        update = self.validate_document(update)
         kwargs["update"] = {"$set": update}
         if unset:
             kwargs["update"] = {**kwargs['update'], "$unset": unset}
         if push:
             kwargs["update"]["$push"] = push
-        return self.collection.update_one(**kwargs)
+        return self.get_ranked_kwargs(kwargs)
 
-    def update_many(self, *, update, set_on_insert=None, action_by=None, **kwargs):
+    def get_update_many_kwargs(self, *, update, set_on_insert=None, action_by=None, **kwargs):
         update["updatedAt"] = datetime.now(IST)
         if action_by is not None:
             update["updatedBy"] = action_by
-        update = self.python_to_bson(update)
+        update = self.validate_document(update)
         kwargs["update"] = {"$set": update}
         if set_on_insert:
-            kwargs["update"].update({"$set"})
-        return self.collection.update_many(**kwargs)
+            kwargs["update"]["$setOnInsert"] = self.validate_document(set_on_insert)
+        return self.get_ranked_kwargs(kwargs)
+
+    def get_ranked_kwargs(self, kwargs):
+        """Turns an update that writes a ranking signal into an update pipeline that also recomputes the key"""
+        if self.ranking is not None and self.ranking.is_affected(kwargs["update"]):
+            pipeline = self.ranking.to_pipeline(kwargs["update"])
+            if pipeline is not None:
+                kwargs["update"] = pipeline
+        return kwargs
+
+    def needs_rank_refresh(self, kwargs):
+        """True for an update that writes a signal but had no pipeline form, the key then takes a second update"""
+        update = kwargs["update"]
+        return self.ranking is not None and isinstance(update, dict) and self.ranking.is_affected(update)
+
+    def bump_version(self):
+        """Invalidates the cached query results read from this collection"""
+        get_collection_versions().bump(self.collection.name)
+
+    def insert_one(self, *, document, action_by=None, **kwargs):
+        if not document:
+            return
+        result = self.collection.insert_one(
+            **self.with_session(self.get_insert_one_kwargs(document=document, action_by=action_by, **kwargs))
+        )
+        self.bump_version()
+        return result
+
+    def insert_many(self, *, documents, action_by=None, **kwargs):
+        result = self.collection.insert_many(
+            **self.with_session(self.get_insert_many_kwargs(documents=documents, action_by=action_by, **kwargs))
+        )
+        self.bump_version()
+        return result
+
+    def find(self, *args, raw=False, tracked=False, read_route=None, **kwargs):
+        return QueryIterator(
+            self.get_collection(raw, read_route).find(*args, **self.with_session(kwargs)),
+            self.get_convertor(raw, tracked)
+        )
+
+    def find_one(self, *args, tracked=False, **kwargs):
+        result = self.collection.find_one(*args, **self.with_session(kwargs))
+        if result is not None and tracked:
+            result = TrackedDocument(result)
+        return result
+
+    def update_one(self, *, update, unset=None, action_by=None, push=None, **kwargs):
+        update_kwargs = self.with_session(
+            self.get_update_one_kwargs(update=update, unset=unset, action_by=action_by, push=push, **kwargs)
+        )
+        result = self.collection.update_one(**update_kwargs)
+        if self.needs_rank_refresh(update_kwargs):
+            self.collection.update_one(update_kwargs["filter"], [self.ranking.get_stage()],
+                                       session=update_kwargs["session"])
+        self.bump_version()
+        return result
+
+    def update_many(self, *, update, set_on_insert=None, action_by=None, **kwargs):
+        update_kwargs = self.with_session(self.get_update_many_kwargs(
+            update=update, set_on_insert=set_on_insert, action_by=action_by, **kwargs
+        ))
+        result = self.collection.update_many(**update_kwargs)
+        if self.needs_rank_refresh(update_kwargs):
+            self.collection.update_many(update_kwargs["filter"], [self.ranking.get_stage()],
+                                        session=update_kwargs["session"])
+        self.bump_version()
+        return result
+
+    def bulk_writer(self, **kwargs):
+        """BulkWriter that batches audit stamped writes on this collection, see mongo.bulk"""
+        return BulkWriter(self, **kwargs)
+
+    def get_save_changes_kwargs(self, *, document, filter=None, action_by=None, **kwargs):
+        """update_one kwargs for the changes of a TrackedDocument, None when nothing changed"""
+        changes = document.get_changes()
+        if not any(changes.values()):
+            return None
+        kwargs["filter"] = filter if filter is not None else {"_id": document["_id"]}
+        return self.get_update_one_kwargs(
+            update=changes["set"], unset=changes["unset"], push=changes["push"], action_by=action_by, **kwargs
+        )
+
+    @staticmethod
+    def mark_saved(document, update_kwargs):
+        fields = get_set_fields(update_kwargs["update"])
+        for key in ("updatedAt", "updatedBy"):
+            if key in fields:
+                document[key] = fields[key]
+        document.mark_clean()
+
+    def save_changes(self, *, document, filter=None, action_by=None, **kwargs):
+        """Write only what changed on a document read with tracked=True"""
+        update_kwargs = self.get_save_changes_kwargs(document=document, filter=filter, action_by=action_by, **kwargs)
+        if update_kwargs is None:
+            return
+        result = self.collection.update_one(**self.with_session(update_kwargs))
+        self.bump_version()
+        self.mark_saved(document, update_kwargs)
+        return result
 
     def __del__(self):
         self.collection = None
@@ -109,21 +436,33 @@ class MongoCollection(MongoDBClient):
 
 
 class HelperCollection(MongoCollection):
+    count_strategy = CountStrategy.EXACT
+    count_cache = TTLCache(maxsize=2048, ttl=60)
+    count_cache_ttl = 60
+    # GeoJSON point field with a 2dsphere index used by aggregate_near, and the field the distance is returned in
+    geo_field = "geoJsonCoordinates"
+    distance_field = "distance"
+    # field search returns the text score in
+    score_field = "score"
+
     # def sample_args(arg_1, arg_2, *args, kw_1="shark", kw_2="blobfish", **kwargs):
     def get_limit_value(self, limit):
         """To prevent limit value tends to infinite"""
         return min(self.MaxPerPageLimit, limit)
 
-    def find(
+    def get_find_cursor(
             self,
             *args,
             defaults: dict = None,
             sort_by: dict = None,
             page: int = 1,
             limit: int = 10,
+            raw: bool = False,
+            after: str = None,
+            read_route: ReadRoute = None,
             **kwargs,
     ):
-        """"""
+        """With `after` (a next_cursor token) the page starts after that row and `page` is ignored"""
 
         if defaults:
             try:
@@ -131,38 +470,277 @@ class HelperCollection(MongoCollection):
             except:
                 print(f"Exception while setting defaults filter: {args}")
 
-        base_query = self.collection.find(*args, **kwargs)
-        base_query.skip((limit - 1) * (page - 1)).limit(limit)
+        sort = self.get_find_sort(sort_by)
+        if after:
+            keyset_match = get_keyset_match(sort, decode_cursor(after, list(sort)))
+            if "filter" in kwargs:
+                kwargs["filter"] = {"$and": [kwargs["filter"], keyset_match]} if kwargs["filter"] else keyset_match
+            else:
+                args = ({"$and": [args[0], keyset_match]} if args and args[0] else keyset_match, *args[1:])
+        base_query = self.get_collection(raw, read_route).find(*args, **self.with_session(kwargs))
+        if not after:
+            base_query.skip(limit * (page - 1))
+        base_query.limit(limit)
+        return base_query.sort(list(sort.items()))
+
+    @staticmethod
+    def get_find_sort(sort_by: dict = None):
+        """Requested sort plus _id, so that the order (and a keyset cursor over it) is total"""
+        sort = {}
         if sort_by:
-            base_query = base_query.sort(
-                sort_by["key"], -1 if sort_by.get("DESC", True) else 1
-            )
+            sort[sort_by["key"]] = -1 if sort_by.get("DESC", True) else 1
+        sort.setdefault("_id", 1)
+        return sort
+
+    def find(
+            self,
+            *args,
+            defaults: dict = None,
+            sort_by: dict = None,
+            page: int = 1,
+            limit: int = 10,
+            raw: bool = False,
+            tracked: bool = False,
+            after: str = None,
+            with_size: bool = False,
+            read_route: ReadRoute = None,
+            **kwargs,
+    ):
+        """with_size=True lets size count the matching documents, once and only when asked"""
+        size_function = self.get_size_function(args, kwargs, defaults, read_route) if with_size else None
+        return QueryIterator(
+            self.get_find_cursor(*args, defaults=defaults, sort_by=sort_by, page=page, limit=limit, raw=raw,
+                                 after=after, read_route=read_route, **kwargs),
+            self.get_convertor(raw, tracked), sort_fields=list(self.get_find_sort(sort_by)), limit=limit,
+            size_function=size_function
+        )
 
-        return QueryIterator(base_query, self.bson_to_python)
+    def get_size_function(self, args, kwargs, defaults=None, read_route=None):
+        query = {**(args[0] if args else kwargs.get("filter") or {}), **(defaults or {})}
+        return functools.partial(
+            self.get_collection(read_route=read_route).count_documents, query, session=self.get_session()
+        )
 
-    def aggregate_count(self, defaults: [dict] = None):
-        filter_list = []
-        matches = [d for d in defaults]
+    @staticmethod
+    def get_count_pipeline(defaults: [dict] = None):
+        matches = [d for d in defaults or []]
         match_list = {"$match": {"$and": matches}} if defaults else {"$match": {}}
-        filter_list.append(match_list)
-        x = self.collection.aggregate([filter_list[0], {
+        return [match_list, {
             "$group": {
                 "_id": "_id",
                 "count": {
                     "$sum": 1
                 }
             }
-        }])
-        data_list = list(x)
-        if len(list(data_list)):
-            return list(data_list)[0].get('count')
+        }]
+
+    @staticmethod
+    def get_count_from_result(data_list):
+        if len(data_list):
+            return data_list[0].get('count')
         return 0
 
+    def aggregate_count(self, defaults: [dict] = None, read_route: ReadRoute = None):
+        return self.get_count_from_result(list(self.get_collection(read_route=read_route).aggregate(
+            self.get_count_pipeline(defaults), comment="count", session=self.get_session()
+        )))
+
+    def get_count_strategy(self, count_strategy=None, matches=None):
+        strategy = CountStrategy(count_strategy) if count_strategy else self.count_strategy
+        if strategy == CountStrategy.ESTIMATED and matches:
+            # collection metadata can only answer for the whole collection
+            return CountStrategy.CACHED
+        return strategy
+
+    def get_count_cache_key(self, matches):
+        return get_query_key(self.collection.full_name, matches)
+
+    def get_count(self, matches, count_strategy, read_route=None):
+        """Total for the strategies that need their own round trip, FACET is answered by aggregate_page"""
+        if count_strategy == CountStrategy.NONE:
+            return None
+        if count_strategy == CountStrategy.ESTIMATED:
+            return self.get_collection(read_route=read_route).estimated_document_count(session=self.get_session())
+        if count_strategy == CountStrategy.CACHED:
+            key = self.get_count_cache_key(matches)
+            size = self.count_cache.get(key)
+            if size is None:
+                size = self.aggregate_count(matches, read_route)
+                self.count_cache.set(key, size, self.count_cache_ttl)
+            return size
+        return self.aggregate_count(matches, read_route)
+
+    @staticmethod
+    def get_facet_pipeline(filter_list):
+        """
+        The leading $match and the $sort stages after it are shared, so an index can serve them, the $skip, $limit and
+        the rest of the page run next to a $count in one $facet. None when the page would be sorted inside the $facet,
+        where no index applies, or is not limited, the whole result would be one document of at most 16MB.
+        """
+        index = next(index for index, stage in enumerate(filter_list) if "$match" in stage) + 1
+        while index < len(filter_list) and "$sort" in filter_list[index]:
+            index += 1
+        data = filter_list[index:]
+        limit_index = next((index for index, stage in enumerate(data) if "$limit" in stage), None)
+        if limit_index is None or any("$sort" in stage for stage in data[:limit_index]):
+            return None
+        return [*filter_list[:index], {"$facet": {"data": data, "total": [{"$count": "count"}]}}]
+
+    @staticmethod
+    def get_facet_result(result):
+        if result is None:
+            return iter([]), 0
+        total = result["total"]
+        return iter(result["data"]), total[0]["count"] if total else 0
+
+    def aggregate_page(self, filter_list, matches, count_strategy=None, raw=False, with_count=True, read_route=None):
+        """Rows of the page and the total, computed with the collection's (or the given) count strategy"""
+        collection = self.get_collection(raw, read_route)
+        session = self.get_session()
+        strategy = self.get_count_strategy(count_strategy, matches) if with_count else CountStrategy.NONE
+        facet_pipeline = self.get_facet_pipeline(filter_list) if strategy == CountStrategy.FACET else None
+        if facet_pipeline is not None:
+            return self.get_facet_result(next(collection.aggregate(facet_pipeline, session=session), None))
+        if strategy == CountStrategy.FACET:
+            strategy = CountStrategy.EXACT
+        return collection.aggregate(filter_list, session=session), self.get_count(matches, strategy, read_route)
+
+    def get_search_pipeline(self, text, defaults=None, page=1, limit=10):
+        """Needs the text index of the collection, rows come best match first"""
+        matches = [{"$text": {"$search": text}}, *self.get_base_matches(defaults)]
+        limit = self.get_limit_value(limit)
+        filter_list = [
+            {"$match": {"$and": matches}},
+            {"$sort": {self.score_field: {"$meta": "textScore"}, "_id": 1}},
+            {"$skip": limit * (page - 1)},
+            {"$limit": limit},
+            {"$addFields": {self.score_field: {"$meta": "textScore"}}},
+            *self.get_page_stages(),
+        ]
+        return filter_list, matches
+
+    def search(
+            self,
+            text: str,
+            defaults: [dict] = None,
+            page: int = 1,
+            limit: int = 10,
+            raw: bool = False,
+            count_strategy: CountStrategy = None,
+            read_route: ReadRoute = None
+    ):
+        """Full text search, for search as you type use mongo.search.PrefixIndex"""
+        filter_list, matches = self.get_search_pipeline(text, defaults, page, limit)
+        cursor, size = self.aggregate_page(filter_list, matches, count_strategy, raw, with_count=page == 1,
+                                           read_route=read_route)
+        return QueryIterator(cursor, self.get_convertor(raw), size)
+
+    def get_geo_near_stage(self, longitude, latitude, max_distance_in_meters=None, matches=None):
+        stage = {
+            "near": {"type": "Point", "coordinates": [longitude, latitude]},
+            "key": self.geo_field,
+            "distanceField": self.distance_field,
+            "spherical": True,
+        }
+        if max_distance_in_meters is not None:
+            stage["maxDistance"] = max_distance_in_meters
+        if matches:
+            stage["query"] = {"$and": matches}
+        return {"$geoNear": stage}
+
+    def get_geo_within_match(self, longitude, latitude, max_distance_in_meters):
+        """Same circle as $geoNear's maxDistance, for counting ($geoNear can not run in a count or a $facet)"""
+        return {self.geo_field: {"$geoWithin": {
+            "$centerSphere": [[longitude, latitude], max_distance_in_meters / EARTH_RADIUS_IN_METERS]
+        }}}
+
+    def get_base_matches(self, defaults=None):
+        return list(defaults or [])
+
+    def get_page_stages(self):
+        """Stages applied to the rows of an aggregate_near or search page, after $skip and $limit"""
+        return []
+
+    def get_near_pipeline(self, longitude, latitude, max_distance_in_meters=None, defaults=None, page=1, limit=10):
+        matches = self.get_base_matches(defaults)
+        limit = self.get_limit_value(limit)
+        filter_list = [
+            self.get_geo_near_stage(longitude, latitude, max_distance_in_meters, matches),
+            {"$skip": limit * (page - 1)},
+            {"$limit": limit},
+            *self.get_page_stages(),
+        ]
+        count_matches = [*matches]
+        if max_distance_in_meters is not None:
+            count_matches.append(self.get_geo_within_match(longitude, latitude, max_distance_in_meters))
+        return filter_list, count_matches
+
+    def get_near_count_strategy(self, count_strategy, matches):
+        strategy = self.get_count_strategy(count_strategy, matches)
+        return CountStrategy.EXACT if strategy == CountStrategy.FACET else strategy
+
+    def aggregate_near(
+            self,
+            longitude: float,
+            latitude: float,
+            max_distance_in_meters: float = None,
+            defaults: [dict] = None,
+            page: int = 1,
+            limit: int = 10,
+            raw: bool = False,
+            count_strategy: CountStrategy = None,
+            read_route: ReadRoute = None
+    ):
+        """
+        Rows nearest to the point first, each with its distance in meters in `distance_field`.
+        defaults are $and-ed into the $geoNear query, so MongoFilter.get_filter_dict() can be passed as one of them.
+        """
+        filter_list, count_matches = self.get_near_pipeline(
+            longitude, latitude, max_distance_in_meters, defaults, page, limit
+        )
+        cursor, size = self.aggregate_page(
+            filter_list, count_matches, self.get_near_count_strategy(count_strategy, count_matches), raw,
+            with_count=page == 1, read_route=read_route
+        )
+        return QueryIterator(cursor, self.get_convertor(raw), size)
+
 
 class VendorCollection(HelperCollection):
+    collection_name = "vendor"
+    # public listings can be a little stale, admin subclasses read the primary
+    read_route = ReadRoute.SECONDARY
+    indexes = (
+        IndexSpec(keys=(("vendorId", 1),), unique=True),
+        # $geoNear of aggregate_near, businessCategory narrows the query inside the index
+        IndexSpec(keys=(("geoJsonCoordinates", "2dsphere"), ("businessCategory", 1))),
+        IndexSpec(keys=(("businessCategory", 1), ("name", "text"), ("urlSlug", "text")), name="search",
+                  options={"weights": {"name": 10, "urlSlug": 2}, "default_language": "none"}),
+        # equality on businessCategory, then the listing sort of get_sort_spec without a sort_by
+        IndexSpec(keys=(("businessCategory", 1), ("rankKey", -1), ("createdAt", 1), ("vendorId", 1)), name="listing"),
+    )
     base = {}
     category = "VENUE"
     admin_req_details = {}
+    ranking = RankingEngine(weights={
+        "bhPartnerStatusValue": 1e12, "specialTagsValue": 1e9, "rating": 1e3, "verificationStatusValue": 1
+    })
+    # mongo.cache.ResultCache for aggregate pages, e.g. LocalResultCache(). Writes through MongoCollection to the
+    # listing collection or to cache_dependencies invalidate it, which needs collection versions shared by every
+    # worker (mongo.cache.get_result_cache_versions).
+    result_cache = None
+    cache_dependencies = ("vendorMedia",)
+    # Dimensions of facet_counts in the nested filter config format, see mongo.facets
+    facet_config = [
+        {"key": "city", "field": "address.city", "filters": []},
+        # `ratings=4` filters on more than 4, the counts have to match
+        {"key": "ratings", "field": "gmapRatings", "exclusiveMin": True, "filters": [
+            {"id": "4.5", "label": "4.5+", "labelSlug": "4-5-plus", "min": 4.5},
+            {"id": "4", "label": "4+", "labelSlug": "4-plus", "min": 4},
+            {"id": "3", "label": "3+", "labelSlug": "3-plus", "min": 3},
+        ]},
+        {"key": "specialTags", "field": "specialTags", "filters": []},
+    ]
+    facet_cache = TTLCache(maxsize=1024, ttl=60)
 
     def get_vendor_projection(self):
         return {
@@ -216,80 +794,197 @@ class VendorCollection(HelperCollection):
             "coordinates": "$geoJsonCoordinates.coordinates",
         }
 
-    def aggregate(
+    def get_aggregate_pipeline(
             self,
             defaults: [dict] = None,
             sort_by: dict = None,
             page: int = 1,
             limit: int = 10,
-            vendor_id_list=None
+            vendor_id_list=None,
+            after: str = None
     ):
-        filter_list = [
-            {
-                "$lookup": {
-                    "from": "vendorMedia",
-                    "localField": "vendorId",
-                    "foreignField": "vendorId",
-                    "as": "vm",
-                    "pipeline": [
-                        {
-                            "$match": {
-                                "$expr": {
-                                    "$and": [
-                                        {
-                                            "$eq": [
-                                                "$isActive",
-                                                True
-                                            ]
-                                        },
-                                        {
-                                            "$eq": [
-                                                "$mediaType",
-                                                "IMAGE"
-                                            ]
-                                        }
-                                    ]
-                                }
-                            }
-                        },
-                        {
-                            "$sort": {"priority": 1}
-                        }
-                    ]
-                }
-            }
-        ]
-        matches = [d for d in defaults]
+        """Listing pipeline and the $and match list it filters on, `after` switches from $skip to a keyset $match"""
+        matches = [d for d in defaults or []]
         if vendor_id_list:
             matches.insert(0, {"vendorId": {"$in": vendor_id_list}})
         matches.append({"businessCategory": self.category})
-        match_list = {"$match": {"$and": matches if defaults else [{"businessCategory": self.category}]}}
-        size = None
-        if page == 1:
-            size = self.aggregate_count(matches)
+        match_list = {"$match": {"$and": matches}}
         # match_list = {"$match": {"$and": [d for d in defaults] if defaults else []}}
-        filter_list.append(match_list)
-        if sort_by:
-            filter_list.append({"$sort": {
-                **{"bhPartnerStatusValue": -1, "specialTagsValue": -1, "rating": -1, "verificationStatusValue": -1},
-                **sort_by,
-                **{"createdAt": 1}
-            }})
+        filter_list = [match_list]
+        sort = self.get_sort_spec(sort_by)
+        if after:
+            filter_list.append({"$match": get_keyset_match(sort, decode_cursor(after, list(sort)))})
+        filter_list.append({"$sort": sort})
 
-        filter_list.append({"$skip": (limit - 1) * (page - 1)})
         limit = self.get_limit_value(limit)
+        if not after:
+            filter_list.append({"$skip": limit * (page - 1)})
         filter_list.append({"$limit": limit})
+        # media is only looked up for the rows of the page
+        filter_list.append(self.get_media_lookup_stage())
 
         project_dict = {
             "$project": {
-                **self.base, **self.get_vendor_projection()
+                **self.base, **self.get_vendor_projection(),
+                SORT_KEY_FIELD: [f"${field}" for field in sort]
             }
         }
         filter_list.append(project_dict)
-        return QueryIterator(
-            self.collection.aggregate(filter_list), self.bson_to_python, size
+        return filter_list, matches
+
+    def get_facet_pipeline_for_filters(self, filters=None, defaults=None):
+        """One $match on everything but the facet fields, then a $facet branch per dimension"""
+        facet_fields = {dimension["field"] for dimension in self.facet_config}
+        filters = filters or {}
+        matches = [
+            *self.get_base_matches(defaults),
+            *({field: value} for field, value in filters.items() if field not in facet_fields),
+        ]
+        facet_filters = {field: value for field, value in filters.items() if field in facet_fields}
+        return [{"$match": {"$and": matches}}, get_facet_stage(self.facet_config, facet_filters)]
+
+    def get_facet_cache_key(self, filters, defaults):
+        names = [self.collection.name]
+        return get_query_key(
+            type(self).__name__, self.category, filters or {}, defaults or [], self.facet_config,
+            dict(zip(names, get_collection_versions().get_many(names)))
+        )
+
+    def facet_counts(self, filters: dict = None, defaults: [dict] = None, read_route: ReadRoute = None):
+        """
+        Counts of every facet_config dimension for the listing filtered by `filters` (MongoFilter.get_filter_dict())
+        and `defaults`, in one aggregation. Results are cached until the next write to the collection.
+        """
+        key = self.get_facet_cache_key(filters, defaults)
+        counts = self.facet_cache.get(key)
+        if counts is None:
+            result = next(self.get_collection(read_route=read_route).aggregate(
+                self.get_facet_pipeline_for_filters(filters, defaults), session=self.get_session()
+            ), None)
+            counts = get_facet_counts(self.facet_config, result)
+            self.facet_cache.set(key, counts)
+        return counts
+
+    def get_plan_samples(self):
+        return [
+            ("aggregate", self.get_aggregate_pipeline()[0]),
+            ("aggregate_near", self.get_near_pipeline(77.59, 12.97, 5000)[0]),
+            ("search", self.get_search_pipeline("palace")[0]),
+        ]
+
+    @staticmethod
+    def get_media_lookup_stage():
+        return {
+            "$lookup": {
+                "from": "vendorMedia",
+                "localField": "vendorId",
+                "foreignField": "vendorId",
+                "as": "vm",
+                "pipeline": [
+                    {
+                        "$match": {
+                            "$expr": {
+                                "$and": [
+                                    {
+                                        "$eq": [
+                                            "$isActive",
+                                            True
+                                        ]
+                                    },
+                                    {
+                                        "$eq": [
+                                            "$mediaType",
+                                            "IMAGE"
+                                        ]
+                                    }
+                                ]
+                            }
+                        }
+                    },
+                    {
+                        "$sort": {"priority": 1}
+                    }
+                ]
+            }
+        }
+
+    def get_base_matches(self, defaults=None):
+        return [*(defaults or []), {"businessCategory": self.category}]
+
+    def get_page_stages(self):
+        return [
+            self.get_media_lookup_stage(),
+            {"$project": {
+                **self.base, **self.get_vendor_projection(), self.distance_field: 1, self.score_field: 1
+            }},
+        ]
+
+    @classmethod
+    def get_sort_spec(cls, sort_by: dict = None):
+        """Listing order, vendorId last so that it is total and can back a keyset cursor"""
+        if cls.ranking is not None:
+            signals = {cls.ranking.field: -1}
+        else:
+            signals = {"bhPartnerStatusValue": -1, "specialTagsValue": -1, "rating": -1, "verificationStatusValue": -1}
+        return {
+            **signals,
+            **(sort_by or {}),
+            **{"createdAt": 1, "vendorId": 1}
+        }
+
+    def get_query_iterator(self, cursor, raw=False, size=None, sort_by=None, limit=10):
+        return QueryIterator(cursor, self.get_convertor(raw), size, sort_fields=list(self.get_sort_spec(sort_by)),
+                             limit=self.get_limit_value(limit))
+
+    def get_result_cache_key(self, defaults, sort_by, page, limit, vendor_id_list, after, count_strategy):
+        names = [self.collection.name, *self.cache_dependencies]
+        return get_query_key(
+            # the sort spec as pairs: the query key sorts dict keys, the order of sort keys matters
+            type(self).__name__, self.category, self.base, defaults or [], list(self.get_sort_spec(sort_by).items()),
+            page, self.get_limit_value(limit), vendor_id_list or [], after,
+            self.get_count_strategy(count_strategy).value, dict(zip(names, get_result_cache_versions().get_many(names)))
         )
 
+    @staticmethod
+    def encode_page(rows, size):
+        return bson.encode({"rows": rows, "size": size}, codec_options=CODEC_OPTIONS)
+
+    @staticmethod
+    def decode_page(data, raw=False):
+        page = bson.decode(data, codec_options=RAW_CODEC_OPTIONS if raw else CODEC_OPTIONS)
+        return page["rows"], page["size"]
+
+    def aggregate(
+            self,
+            defaults: [dict] = None,
+            sort_by: dict = None,
+            page: int = 1,
+            limit: int = 10,
+            vendor_id_list=None,
+            raw: bool = False,
+            after: str = None,
+            count_strategy: CountStrategy = None,
+            read_route: ReadRoute = None
+    ):
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.get_result_cache_key(defaults, sort_by, page, limit, vendor_id_list, after, count_strategy)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                rows, size = self.decode_page(cached, raw)
+                return self.get_query_iterator(iter(rows), raw, size, sort_by, limit)
+
+        filter_list, matches = self.get_aggregate_pipeline(defaults, sort_by, page, limit, vendor_id_list, after)
+        cursor, size = self.aggregate_page(filter_list, matches, count_strategy, raw, with_count=page == 1 and not after,
+                                           read_route=read_route)
+        if cache_key is not None:
+            # rows are cached as read from the cursor and decoded into fresh objects on every hit
+            data = self.encode_page(list(cursor), size)
+            self.result_cache.set(cache_key, data)
+            rows, size = self.decode_page(data, raw)
+            cursor = iter(rows)
+        return self.get_query_iterator(cursor, raw, size, sort_by, limit)
+
 
 class DecorCollection(VendorCollection):
     category = "DECORATION"
@@ -425,17 +1120,31 @@ class PhotographyCollection(DecorCollection):
 
 class AdminVendorCollection(VendorCollection):
     base = {"mobile.phoneNumber": 1, "mobile.countryCode": 1, "verificationStatus": 1, "seoStatus": 1}
+    read_route = ReadRoute.PRIMARY
 
 
 class AdminDecorCollection(DecorCollection):
     base = {"mobile.phoneNumber": 1, "mobile.countryCode": 1, "verificationStatus": 1, "seoStatus": 1}
+    read_route = ReadRoute.PRIMARY
 
 
 class AdminPhotographyCollection(PhotographyCollection):
     base = {"mobile.phoneNumber": 1, "mobile.countryCode": 1, "verificationStatus": 1, "seoStatus": 1}
+    read_route = ReadRoute.PRIMARY
 
 
 class VendorMediaCollection(HelperCollection):
+    collection_name = "vendorMedia"
+    # also serves the vendorMedia $lookup of VendorCollection
+    indexes = (
+        IndexSpec(keys=(("vendorId", 1), ("isActive", 1), ("mediaType", 1), ("priority", 1))),
+        IndexSpec(keys=(("vendorId", 1), ("priority", 1), ("_id", 1))),
+    )
+
+    def get_plan_samples(self):
+        sort = self.get_find_sort({"key": "priority", "DESC": False})
+        return [("find", [{"$match": {"vendorId": ""}}, {"$sort": sort}])]
+
     def find(
             self,
             *args,
@@ -515,7 +1224,8 @@ class VendorAppUserCollection(HelperCollection):
             limit: int = 10,
             sort_key: str = None,
             sort_key_column: str = "businessDetails.name",
-            use_limit: bool = True
+            use_limit: bool = True,
+            raw: bool = False
     ):
         filter_list = []
         matches = [d for d in defaults]
@@ -525,10 +1235,11 @@ class VendorAppUserCollection(HelperCollection):
         if sort_by:
             filter_list.append({"$sort": {**sort_by, **{"createdAt": -1}}})
         if sort_key:
+            from filters.constant import sort_key_map  # only the lead listings need it, kept off the import path
             filter_list.append({"$sort": {sort_key_column: sort_key_map[sort_key]}})
         if use_limit:
-            filter_list.append({"$skip": (limit - 1) * (page - 1)})
             limit = self.get_limit_value(limit)
+            filter_list.append({"$skip": limit * (page - 1)})
             filter_list.append({"$limit": limit})
         project_dict = {
             "$project": {
@@ -537,7 +1248,7 @@ class VendorAppUserCollection(HelperCollection):
         }
         filter_list.append(project_dict)
         return QueryIterator(
-            self.collection.aggregate(filter_list), self.bson_to_python
+            self.get_collection(raw).aggregate(filter_list, session=self.get_session()), self.get_convertor(raw)
         )
 
 
@@ -577,8 +1288,11 @@ class LeadsCollection(VendorAppUserCollection):
             self,
             defaults: [dict] = None,
             sort_by: dict = None,
-            sort_key: str = None
+            sort_key: str = None,
+            raw: bool = False,
+            batch_size: int = None
     ):
+        """Every matching lead, batch_size sets the cursor batch size for exports that stream the result"""
         filter_list = []
         matches = [d for d in defaults]
         match_list = {"$match": {"$and": matches}} if defaults else {"$match": {}}
@@ -587,6 +1301,7 @@ class LeadsCollection(VendorAppUserCollection):
         if sort_by:
             filter_list.append({"$sort": {**sort_by, **{"createdAt": -1}}})
         if sort_key:
+            from filters.constant import sort_key_map
             filter_list.append({"$sort": {"businessDetails.name": sort_key_map[sort_key]}})
 
         project_dict = {
@@ -609,12 +1324,19 @@ class LeadsCollection(VendorAppUserCollection):
         }
         filter_list.append(project_dict)
         filter_list.append(lookup_exp)
+        kwargs = {"batchSize": batch_size} if batch_size else {}
         return QueryIterator(
-            self.collection.aggregate(filter_list), self.bson_to_python
+            self.get_collection(raw).aggregate(filter_list, **self.with_session(kwargs)), self.get_convertor(raw)
         )
 
 
 class LeadsVendorCollection(VendorAppUserCollection):
+    collection_name = "vendorLeadsAssignment"
+    # serves the vendorLeadsAssignment $lookup of LeadsCollection.aggregate_excluding_limit
+    indexes = (
+        IndexSpec(keys=(("leadId", 1),)),
+    )
+
     def get_vendor_projection(self):
         return {
             "_id": 0,
@@ -627,6 +1349,21 @@ class LeadsVendorCollection(VendorAppUserCollection):
         }
 
 
+class NGOCollection(HelperCollection):
+    collection_name = "ngo"
+    read_route = ReadRoute.SECONDARY
+    indexes = (
+        IndexSpec(keys=(("geoJsonCoordinates", "2dsphere"),)),
+        IndexSpec(keys=(("name", "text"),), name="search", options={"default_language": "none"}),
+    )
+
+    def get_plan_samples(self):
+        return [
+            ("aggregate_near", self.get_near_pipeline(77.59, 12.97, 5000)[0]),
+            ("search", self.get_search_pipeline("trust")[0]),
+        ]
+
+
 class NotificationContentCollection(HelperCollection):
     def get_vendor_projection(self):
         return {
@@ -667,7 +1404,9 @@ class VendorLeadsCSVCollection(HelperCollection):
             defaults: [dict] = None,
             page: int = 1,
             limit: int = 10,
-            use_limit: bool = True
+            use_limit: bool = True,
+            raw: bool = False,
+            count_strategy: CountStrategy = None
     ):
         filter_list = [{
             "$lookup": {
@@ -688,19 +1427,15 @@ class VendorLeadsCSVCollection(HelperCollection):
         filter_list.insert(0, match_list)
         filter_list.append({"$sort": {"createdAt": -1}})
         if use_limit:
-            filter_list.append({"$skip": (limit - 1) * (page - 1)})
             limit = self.get_limit_value(limit)
+            filter_list.append({"$skip": limit * (page - 1)})
             filter_list.append({"$limit": limit})
         project_dict = {
             "$project": {
                 **self.base, **self.get_vendor_leads_csv_projection()
             }
         }
-        size = None
-        if page == 1:
-            size = self.aggregate_count(matches)
         filter_list.append(project_dict)
         filter_list.append({"$unwind": "$adminEmail"})
-        return QueryIterator(
-            self.collection.aggregate(filter_list), self.bson_to_python, size
-        )
+        cursor, size = self.aggregate_page(filter_list, matches, count_strategy, raw, with_count=page == 1)
+        return QueryIterator(cursor, self.get_convertor(raw), size)
@@ -0,0 +1,155 @@
+import atexit
+import hashlib
+import logging
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+DEFAULT_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+DEFAULT_IDLE_TIMEOUT_IN_SECONDS = int(os.environ.get("MONGO_MAX_IDLE_TIME_SECONDS", 10 * 60))
+
+
+def get_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def get_pool_options(max_pool_size=None, min_pool_size=None, idle_timeout_in_seconds=None,
+                     wait_queue_timeout_in_seconds=None):
+    """MongoClient keyword arguments for the pool settings, falling back to the MONGO_* environment defaults"""
+    options = {
+        "maxPoolSize": DEFAULT_MAX_POOL_SIZE if max_pool_size is None else max_pool_size,
+        "minPoolSize": DEFAULT_MIN_POOL_SIZE if min_pool_size is None else min_pool_size,
+        "maxIdleTimeMS": (DEFAULT_IDLE_TIMEOUT_IN_SECONDS if idle_timeout_in_seconds is None
+                          else idle_timeout_in_seconds) * 1000,
+    }
+    if wait_queue_timeout_in_seconds is not None:
+        options["waitQueueTimeoutMS"] = wait_queue_timeout_in_seconds * 1000
+    return options
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events of one MongoClient, per server address"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _add(self, address, key, value=1):
+        with self._lock:
+            stats = self._stats.setdefault("%s:%s" % address, {
+                "open": 0, "checkedOut": 0, "created": 0, "closed": 0, "checkOutFailed": 0, "cleared": 0
+            })
+            stats[key] += value
+
+    def get_stats(self):
+        with self._lock:
+            return {address: dict(stats) for address, stats in self._stats.items()}
+
+    def pool_created(self, event):
+        self._add(event.address, "open", 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(event.address, "cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(event.address, "created")
+        self._add(event.address, "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(event.address, "closed")
+        self._add(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add(event.address, "checkOutFailed")
+
+    def connection_checked_out(self, event):
+        self._add(event.address, "checkedOut")
+
+    def connection_checked_in(self, event):
+        self._add(event.address, "checkedOut", -1)
+
+
+class ConnectionManager:
+    """
+    Keeps one MongoClient per (connection string, options, pid).
+    Clients live for the whole process, pymongo's own pool closes idle sockets after maxIdleTimeMS. After a fork the
+    child drops the inherited clients without closing them (the sockets still belong to the parent) and builds its own.
+    """
+
+    def __init__(self, client_class=MongoClient):
+        self.client_class = client_class
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._listeners = {}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._listeners = {}
+
+    @staticmethod
+    def get_key(connection_string, options):
+        return get_hash(connection_string), tuple(sorted(options.items())), os.getpid()
+
+    def get_store(self):
+        """(clients, listeners) dicts of the calling context"""
+        return self._clients, self._listeners
+
+    def get_stores(self):
+        return [(self._clients, self._listeners)]
+
+    def get_client(self, connection_string, event_listeners=None, **options):
+        key = self.get_key(connection_string, options)
+        clients, listeners = self.get_store()
+        client = clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = clients.get(key)
+            if client is None:
+                listener = PoolStatsListener()
+                client = self.client_class(
+                    connection_string, event_listeners=[listener, *(event_listeners or [])], **options
+                )
+                clients[key] = client
+                listeners[key] = listener
+                logger.info("New mongo client %s for pid %s", key[0][:12], key[2])
+        return client
+
+    def pool_stats(self):
+        """Connection pool counters of the clients owned by this process"""
+        pid = os.getpid()
+        return {
+            f"{key[0][:12]}:{dict(key[1])}" + (f":{index}" if index else ""): listener.get_stats()
+            for index, (_, listeners) in enumerate(self.get_stores())
+            for key, listener in list(listeners.items()) if key[2] == pid
+        }
+
+    def close_all(self):
+        pid = os.getpid()
+        with self._lock:
+            for key in [key for key in self._clients if key[2] == pid]:
+                self._clients.pop(key).close()
+                self._listeners.pop(key, None)
+
+
+connection_manager = ConnectionManager()
+atexit.register(connection_manager.close_all)
@@ -3,7 +3,7 @@ from dataclasses import dataclass
 import pymongo
 from pymongo.collection import Collection
 
-from mongo.mongo import MongoOperations
+from mongo.enums import MongoOperations
 
 
 @dataclass
@@ -14,16 +14,22 @@ class MongoOperationDataClass:
     aggregation_query: list | None = None
     bulk_query: list | None = None
 
+    @property
+    def request_class(self):
+        """pymongo write model of the operation, e.g. update_one -> pymongo.UpdateOne"""
+        return getattr(pymongo, ''.join(x.title() for x in self.operation_name.value.split('_')))
+
+    def get_request(self):
+        return self.request_class(**self.operation_params)
+
     def execute(self, session=None):
         """"""
         if self.operation_name == MongoOperations.AGGREGATE:
             return getattr(self.collection, self.operation_name.value)(self.aggregation_query, session=session)
         if self.operation_name in MongoOperations:
             if self.bulk_query:
-                operation_name_in_pascal = ''.join(x.title() for x in self.operation_name.value.split('_'))
                 return self.collection.bulk_write(
-                    [getattr(pymongo, operation_name_in_pascal)(**operation_param)
-                     for operation_param in self.bulk_query], session=session)
+                    [self.request_class(**operation_param) for operation_param in self.bulk_query], session=session)
             return getattr(self.collection, self.operation_name.value)(**self.operation_params, session=session)
         else:
             raise ValueError(f"Unsupported operation: {self.operation_name}")
@@ -12,3 +12,18 @@ class MongoOperations(Enum):
     AGGREGATE = 'aggregate'
     FIND_ONE = "find_one"
     FIND = 'find'
+
+
+class CountStrategy(Enum):
+    """How a listing computes its total on page 1"""
+    EXACT = "exact"  # separate $match + $group aggregation
+    FACET = "facet"  # page and total in one $facet round trip, EXACT when the page is not sorted and limited before it
+    CACHED = "cached"  # exact count kept in a TTL cache keyed by the filter
+    ESTIMATED = "estimated"  # collection metadata when nothing is filtered, CACHED otherwise
+    NONE = "none"
+
+
+class ReadRoute(Enum):
+    """Where the listing and count reads of a collection are served from, see mongo.routing"""
+    PRIMARY = "primary"
+    SECONDARY = "secondary"  # secondaryPreferred, bounded by max staleness
@@ -0,0 +1,94 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+import pymongo
+from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
+
+from .collection import QueryIterator
+from .data_operation import MongoOperationDataClass
+from .routing import current_session
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("MONGO_FANOUT_WORKERS", 8))
+
+
+class MongoExecutor:
+    """
+    Runs independent Mongo operations at the same time on a bounded thread pool and returns their results in order.
+    Items are MongoOperationDataClass instances or callables, e.g. functools.partial(vendors.aggregate, defaults=...).
+    The pool threads share the process wide cached MongoClient, so they only add concurrent checkouts from its pool.
+    Cursors are read inside the task: a pymongo cursor comes back as a list, a QueryIterator with its rows fetched.
+
+        page, config = mongo_executor.run([
+            partial(vendors.aggregate, defaults=filters, page=1),
+            partial(config.find_one, {"key": "listing"}),
+        ], timeout=2)
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="mongo-executor", initializer=self._mark_worker
+                    )
+        return self._pool
+
+    def _mark_worker(self):
+        self._local.in_pool = True
+
+    def _call(self, operation, deadline):
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.001)
+        # client side operation timeout, so work that is already running stops at the deadline as well
+        with pymongo.timeout(remaining):
+            result = operation.execute() if isinstance(operation, MongoOperationDataClass) else operation()
+            # a cursor only runs its query when iterated, that has to happen here, inside the task and the timeout
+            if isinstance(result, (Cursor, CommandCursor)):
+                return list(result)
+            if isinstance(result, QueryIterator):
+                return result.fetch()
+            return result
+
+    def run(self, operations, timeout=None):
+        """
+        Results in the order of `operations`. The first failure cancels what has not started yet and is re-raised,
+        TimeoutError is raised when the batch is not done within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if getattr(self._local, "in_pool", False) or len(operations) < 2 or current_session.get() is not None:
+            # nested fan-out from a pool thread would wait on itself, and a causal session can not be shared by
+            # concurrent operations, run it inline
+            return [self._call(operation, deadline) for operation in operations]
+
+        futures = [
+            self.pool.submit(contextvars.copy_context().run, self._call, operation, deadline)
+            for operation in operations
+        ]
+        done, not_done = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+        failed = next((future for future in futures if future in done and future.exception() is not None), None)
+        if failed is not None or not_done:
+            for future in not_done:
+                future.cancel()
+            if failed is not None:
+                raise failed.exception()
+            raise TimeoutError(f"{len(not_done)} of {len(futures)} mongo operations did not finish in {timeout}s")
+        return [future.result() for future in futures]
+
+
+mongo_executor = MongoExecutor()
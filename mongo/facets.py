@@ -0,0 +1,96 @@
+"""
+Filter counts for listing pages in one $facet aggregation. Dimensions use the nested filter config format of
+utils.utils.get_nested_filters plus the document field they count on:
+
+    {"key": "ratings", "field": "gmapRatings", "filters": [{"id": "4", "label": "4+", "labelSlug": "4-plus", "min": 4}]}
+
+Leaves with min/max count a range of the field, min included unless the dimension sets "exclusiveMin" (it has to
+agree with the operator the listing filters the leaf id with, e.g. `ratings=4` is $gt 4), other leaves count the
+documents whose field (or one of its values, for arrays) equals the leaf id. Without leaves the most frequent values
+are returned. Each dimension is counted with the active filters of the other dimensions only, so a selected city
+does not hide the counts of the other cities.
+"""
+
+DEFAULT_TOP_VALUES = 20
+
+
+def get_leaf_filters(filters):
+    """Leaves of a nested filter config, like utils.utils.get_nested_filters but keeping every leaf key"""
+    leaves = []
+    for item in filters:
+        if item.get("filters"):
+            leaves.extend(get_leaf_filters(item["filters"]))
+        else:
+            leaves.append(item)
+    return leaves
+
+
+def is_range(leaf):
+    return "min" in leaf or "max" in leaf
+
+
+def get_range_condition(field, leaf, exclusive_min=False):
+    # expression comparisons order across BSON types ("" is above every number), a query range never matches them
+    conditions = [{"$isNumber": f"${field}"}]
+    if leaf.get("min") is not None:
+        conditions.append({"$gt" if exclusive_min else "$gte": [f"${field}", leaf["min"]]})
+    if leaf.get("max") is not None:
+        conditions.append({"$lt": [f"${field}", leaf["max"]]})
+    return {"$and": conditions}
+
+
+def get_dimension_pipeline(dimension):
+    field = dimension["field"]
+    leaves = get_leaf_filters(dimension.get("filters", []))
+    if leaves and all(is_range(leaf) for leaf in leaves):
+        exclusive_min = dimension.get("exclusiveMin", False)
+        return [{"$group": {
+            "_id": None,
+            **{f"c{index}": {"$sum": {"$cond": [get_range_condition(field, leaf, exclusive_min), 1, 0]}}
+               for index, leaf in enumerate(leaves)},
+        }}]
+    pipeline = [{"$project": {"_id": 0, "value": f"${field}"}}, {"$unwind": "$value"}]
+    if leaves:
+        pipeline.append({"$match": {"value": {"$in": [leaf["id"] for leaf in leaves]}}})
+    pipeline.append({"$group": {"_id": "$value", "count": {"$sum": 1}}})
+    if not leaves:
+        pipeline.extend([{"$sort": {"count": -1, "_id": 1}}, {"$limit": dimension.get("size", DEFAULT_TOP_VALUES)}])
+    return pipeline
+
+
+def get_facet_stage(dimensions, filters):
+    """filters is the field -> condition dict of MongoFilter.get_filter_dict(), limited to the dimension fields"""
+    facets = {}
+    for dimension in dimensions:
+        others = {field: value for field, value in filters.items() if field != dimension["field"]}
+        pipeline = [{"$match": others}] if others else []
+        facets[dimension["key"]] = pipeline + get_dimension_pipeline(dimension)
+    return {"$facet": facets}
+
+
+def get_facet_counts(dimensions, result):
+    """Leaves of every dimension in config order with their count, zero counts included"""
+    counts = {}
+    for dimension in dimensions:
+        rows = result.get(dimension["key"], []) if result else []
+        leaves = get_leaf_filters(dimension.get("filters", []))
+        if leaves and all(is_range(leaf) for leaf in leaves):
+            totals = rows[0] if rows else {}
+            counts[dimension["key"]] = [
+                {"id": leaf["id"], "label": leaf["label"], "labelSlug": leaf["labelSlug"],
+                 "count": totals.get(f"c{index}", 0)}
+                for index, leaf in enumerate(leaves)
+            ]
+        elif leaves:
+            by_value = {row["_id"]: row["count"] for row in rows}
+            counts[dimension["key"]] = [
+                {"id": leaf["id"], "label": leaf["label"], "labelSlug": leaf["labelSlug"],
+                 "count": by_value.get(leaf["id"], 0)}
+                for leaf in leaves
+            ]
+        else:
+            counts[dimension["key"]] = [
+                {"id": row["_id"], "label": row["_id"], "labelSlug": row["_id"], "count": row["count"]}
+                for row in rows
+            ]
+    return counts
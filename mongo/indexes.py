@@ -0,0 +1,190 @@
+"""
+Index specs declared on the collection classes (`indexes`, `collection_name`), syncing them to a database and an
+explain based check of the pipelines the classes build (`get_plan_samples`).
+"""
+from dataclasses import dataclass, field
+
+from pymongo import IndexModel, MongoClient
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    keys: tuple
+    name: str = None
+    unique: bool = False
+    sparse: bool = False
+    partial_filter: dict = None
+    options: dict = field(default_factory=dict)
+
+    def get_name(self):
+        return self.name or "_".join(f"{key}_{direction}" for key, direction in self.keys)
+
+    def to_index_model(self):
+        kwargs = {"name": self.get_name(), **self.options}
+        if self.unique:
+            kwargs["unique"] = True
+        if self.sparse:
+            kwargs["sparse"] = True
+        if self.partial_filter:
+            kwargs["partialFilterExpression"] = self.partial_filter
+        return IndexModel(list(self.keys), **kwargs)
+
+    @property
+    def is_text(self):
+        return any(direction == "text" for _, direction in self.keys)
+
+    def get_text_weights(self):
+        weights = {key: 1 for key, direction in self.keys if direction == "text"}
+        weights.update(self.options.get("weights", {}))
+        return weights
+
+    def keys_match(self, info):
+        if not self.is_text:
+            return [tuple(key) for key in info["key"]] == [tuple(key) for key in self.keys]
+        # the server reports the text part of the key as _fts/_ftsx, the fields are in the weights
+        server_keys = [tuple(key) for key in info["key"] if key[0] not in ("_fts", "_ftsx")]
+        return server_keys == [tuple(key) for key in self.keys if key[1] != "text"] and \
+            info.get("weights") == self.get_text_weights() and \
+            info.get("default_language", "english") == self.options.get("default_language", "english")
+
+    def matches(self, info):
+        """info is an entry of Collection.index_information()"""
+        return self.keys_match(info) and \
+            bool(info.get("unique")) == self.unique and bool(info.get("sparse")) == self.sparse and \
+            info.get("partialFilterExpression") == self.partial_filter
+
+
+def get_collection_classes(base=None):
+    """Every synchronous MongoCollection class with a collection_name, declared or inherited"""
+    if base is None:
+        from .collection import MongoCollection
+        base = MongoCollection
+    classes = [base] if base.collection_name and base.client_class is MongoClient else []
+    for subclass in base.__subclasses__():
+        classes.extend(cls for cls in get_collection_classes(subclass) if cls not in classes)
+    return classes
+
+
+def get_index_specs(classes=None):
+    """collection name -> index specs, collected over classes sharing a collection"""
+    specs = {}
+    for cls in classes or get_collection_classes():
+        names = specs.setdefault(cls.collection_name, {})
+        for spec in cls.indexes:
+            names.setdefault(spec.get_name(), spec)
+    return {name: list(collection_specs.values()) for name, collection_specs in specs.items()}
+
+
+def sync_indexes(database, specs, drop=False, dry_run=False):
+    """
+    Creates the declared indexes that are missing and rebuilds the ones whose definition changed.
+    Indexes on the server that are not declared are reported, and dropped with drop=True.
+    Returns {"created": [...], "rebuilt": [...], "extra": [...], "dropped": [...]} of "collection.index" names.
+    """
+    report = {"created": [], "rebuilt": [], "extra": [], "dropped": []}
+    for collection_name, collection_specs in specs.items():
+        collection = database.get_collection(collection_name)
+        existing = collection.index_information()
+        to_create = []
+        for spec in collection_specs:
+            name = spec.get_name()
+            if name not in existing:
+                report["created"].append(f"{collection_name}.{name}")
+                to_create.append(spec)
+            elif not spec.matches(existing[name]):
+                report["rebuilt"].append(f"{collection_name}.{name}")
+                if not dry_run:
+                    collection.drop_index(name)
+                to_create.append(spec)
+        declared = {spec.get_name() for spec in collection_specs}
+        for name in existing:
+            if name != "_id_" and name not in declared:
+                report["dropped" if drop else "extra"].append(f"{collection_name}.{name}")
+                if drop and not dry_run:
+                    collection.drop_index(name)
+        if to_create and not dry_run:
+            collection.create_indexes([spec.to_index_model() for spec in to_create])
+    return report
+
+
+def explain_pipeline(collection, pipeline):
+    return collection.database.command(
+        {"explain": {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}, "verbosity": "executionStats"},
+        codec_options=collection.codec_options,
+    )
+
+
+def iter_plan_stages(plan):
+    """Every query plan stage of an explain output, for both the classic and the slot based engine"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for value in plan.values():
+            yield from iter_plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from iter_plan_stages(value)
+
+
+def get_winning_plans(explain):
+    plans = []
+    for stage in explain.get("stages", [explain]):
+        planner = stage.get("$cursor", stage).get("queryPlanner")
+        if planner:
+            plans.append(planner["winningPlan"])
+    for shard in explain.get("shards", {}).values():
+        plans.extend(get_winning_plans(shard))
+    return plans
+
+
+def get_lookup_index_problem(database, lookup):
+    foreign_field = lookup.get("foreignField")
+    if not foreign_field:
+        return f"$lookup from {lookup['from']} without foreignField can not use an index"
+    for info in database.get_collection(lookup["from"]).index_information().values():
+        if info["key"][0][0] == foreign_field:
+            return None
+    return f"$lookup from {lookup['from']} on {foreign_field} has no index starting with {foreign_field}"
+
+
+def is_text_score_sort(pattern):
+    """A sort on {$meta: "textScore"} is always blocking, no index can provide it"""
+    return isinstance(pattern, dict) and any(
+        isinstance(value, dict) and value.get("$meta") == "textScore" for value in pattern.values()
+    )
+
+
+def check_plan(collection, pipeline):
+    """Problems found in the plan of `pipeline`: collection scans, in memory sorts and unindexed $lookup stages"""
+    explain = explain_pipeline(collection, pipeline)
+    problems = []
+    for plan in get_winning_plans(explain):
+        for stage in iter_plan_stages(plan):
+            if stage["stage"] == "COLLSCAN":
+                problems.append(f"COLLSCAN on {collection.name}")
+            elif stage["stage"] == "SORT" and not is_text_score_sort(stage.get("sortPattern")):
+                problems.append(f"in memory SORT on {stage.get('sortPattern')}")
+            elif stage["stage"] == "EQ_LOOKUP" and stage.get("strategy") != "IndexedLoopJoin":
+                problems.append(f"$lookup from {stage.get('foreignCollection')} ran as {stage.get('strategy')}")
+    for stage in explain.get("stages", []):
+        if "$sort" in stage and not is_text_score_sort(stage["$sort"].get("sortKey")):
+            problems.append(f"in memory $sort on {stage['$sort'].get('sortKey')}")
+        elif "$lookup" in stage:
+            if stage.get("collectionScans"):
+                problems.append(f"$lookup from {stage['$lookup']['from']} ran {stage['collectionScans']} COLLSCANs")
+    for stage in pipeline:
+        if "$lookup" in stage:
+            problem = get_lookup_index_problem(collection.database, stage["$lookup"])
+            if problem:
+                problems.append(problem)
+    return problems
+
+
+def check_plans(client, classes=None):
+    """(class name, sample name, problems) for every sample pipeline of the collection classes"""
+    results = []
+    for cls in classes or get_collection_classes():
+        instance = cls(connection=client, collection_name=cls.collection_name)
+        for sample_name, pipeline in instance.get_plan_samples():
+            results.append((cls.__name__, sample_name, check_plan(instance.collection, pipeline)))
+    return results
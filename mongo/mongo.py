@@ -1,29 +1,34 @@
-import atexit
-import hashlib
-
 from pymongo import MongoClient
 from bson import Decimal128
 from decimal import Decimal
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 from bson.objectid import ObjectId
 
-
-def get_hash(text):
-    return hashlib.sha256(text.encode()).hexdigest()
+from .connection import connection_manager, get_hash, get_pool_options
+from .monitoring import command_listener
 
 
 class MongoDBClient:
-    CONNECTION_CACHE = {}
+    connection_manager = connection_manager
+    client_class = MongoClient
+    # pymongo listeners added to every client made here, command_listener feeds mongo.monitoring
+    event_listeners = (command_listener,)
 
     def __init__(self, *, connection_string=None, use_cache=True, connection=None, idle_timeout_in_seconds=None,
-                 **kwargs):
+                 max_pool_size=None, min_pool_size=None, wait_queue_timeout_in_seconds=None, **kwargs):
         if connection is not None:
             self._client = connection
         else:
+            pool_options = get_pool_options(max_pool_size, min_pool_size, idle_timeout_in_seconds,
+                                            wait_queue_timeout_in_seconds)
             if use_cache:
-                self._client = self._cache_mongo_connection(connection_string, idle_timeout_in_seconds)
+                self._client = self.connection_manager.get_client(
+                    connection_string, event_listeners=self.event_listeners, **pool_options
+                )
             else:
-                self._client = MongoClient(connection_string)
+                self._client = self.client_class(
+                    connection_string, event_listeners=list(self.event_listeners), **pool_options
+                )
         self.use_cache = use_cache
         self._default_db = self._client.get_default_database()
 
@@ -69,49 +74,38 @@ class MongoDBClient:
 
     @classmethod
     def clean_cached_connection(cls):
-        for conn_hash, db_conn in cls.CONNECTION_CACHE.items():
-            db_conn.get('connection').close()
+        cls.connection_manager.close_all()
+
+    @classmethod
+    def pool_stats(cls):
+        return cls.connection_manager.pool_stats()
 
     @staticmethod
     def get_object_id(object_id):
         return ObjectId(object_id)
 
     @classmethod
-    def flatten(cls, data, prefix=''):
+    def flatten(cls, data, prefix='', keep_empty=False):
+        """keep_empty=True keeps empty sub documents as leaves instead of dropping them"""
         temp = {}
         for key, value in data.items():
-            if isinstance(value, dict):
-                temp.update(cls.flatten(value, f"{prefix}{key}."))
+            if isinstance(value, dict) and (value or not keep_empty):
+                temp.update(cls.flatten(value, f"{prefix}{key}.", keep_empty))
             else:
                 temp[f"{prefix}{key}"] = value
         return temp
 
     @classmethod
-    def _cache_mongo_connection(cls, connection_string, idle_timeout_in_seconds):
-        if idle_timeout_in_seconds is None:
-            idle_timeout_in_seconds = 10 * 60
-        conn_hash = get_hash(connection_string)
-        cached_connection = cls.CONNECTION_CACHE.get(conn_hash)
-        if cached_connection is None or cached_connection.get('expiresAt') < datetime.now():
-            if cached_connection is not None:
-                cached_connection.get('connection').close()
-            connection = MongoClient(connection_string, maxIdleTimeMS=idle_timeout_in_seconds * 100)
-            cls.CONNECTION_CACHE[conn_hash] = {
-                "connection": connection
-                , "expiresAt": datetime.now() + timedelta(seconds=idle_timeout_in_seconds - 5)
-            }
-            print("NEW_CONNECTION")
-        else:
-            connection = cached_connection.get('connection')
-            print("CONNECTION_REUSED")
-        return connection
-
-    @classmethod
-    def get_client(cls, connection_string, use_cache=True, idle_timeout_in_seconds=None, **kwargs):
+    def get_client(cls, connection_string, use_cache=True, idle_timeout_in_seconds=None, max_pool_size=None,
+                   min_pool_size=None, wait_queue_timeout_in_seconds=None, **kwargs):
+        pool_options = get_pool_options(max_pool_size, min_pool_size, idle_timeout_in_seconds,
+                                        wait_queue_timeout_in_seconds)
         if use_cache:
-            connection = cls._cache_mongo_connection(connection_string, idle_timeout_in_seconds)
+            connection = cls.connection_manager.get_client(
+                connection_string, event_listeners=cls.event_listeners, **pool_options
+            )
         else:
-            connection = MongoClient(connection_string)
+            connection = cls.client_class(connection_string, event_listeners=list(cls.event_listeners), **pool_options)
         return cls(use_cache=use_cache, connection=connection, **kwargs)
 
     def __del__(self):
@@ -119,6 +113,3 @@ class MongoDBClient:
         if self.use_cache is False and self._client:
             self._client.close()
         self._client = None
-
-
-atexit.register(MongoDBClient.clean_cached_connection)
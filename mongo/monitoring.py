@@ -0,0 +1,192 @@
+"""
+Command monitoring for every client made through MongoDBClient. Commands are timed per (command, collection) into
+histograms, rolled up for the current request when one was started with start_request (see base.middleware) and
+logged with the shape of the command when slower than MONGO_SLOW_QUERY_MS.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+
+import bson
+from pymongo import monitoring
+
+from .codecs import CODEC_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("MONGO_SLOW_QUERY_MS", 200))
+# re-encodes every reply, keep it for debugging sessions
+RECORD_REPLY_SIZE = os.environ.get("MONGO_RECORD_REPLY_SIZE", "0") == "1"
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+@dataclass
+class CommandRecord:
+    command: str
+    collection: str
+    duration_ms: float
+    returned: int = 0
+    reply_bytes: int = 0
+    failed: bool = False
+    # the `comment` option of the command, e.g. aggregate_count sends "count"
+    comment: str = None
+
+    @property
+    def label(self):
+        return f"{self.command}:{self.comment}" if self.comment else self.command
+
+
+@dataclass
+class RequestStats:
+    commands: list = field(default_factory=list)
+    convert_seconds: float = 0
+
+    @property
+    def command_ms(self):
+        return sum(record.duration_ms for record in self.commands)
+
+    @property
+    def convert_ms(self):
+        return self.convert_seconds * 1000
+
+    def get_summary(self):
+        """command label -> {"count", "ms", "returned", "bytes"}"""
+        summary = {}
+        for record in self.commands:
+            item = summary.setdefault(record.label, {"count": 0, "ms": 0, "returned": 0, "bytes": 0})
+            item["count"] += 1
+            item["ms"] += record.duration_ms
+            item["returned"] += record.returned
+            item["bytes"] += record.reply_bytes
+        return summary
+
+
+request_stats = contextvars.ContextVar("mongo_request_stats", default=None)
+
+
+def start_request():
+    return request_stats.set(RequestStats())
+
+
+def end_request(token):
+    stats = request_stats.get()
+    request_stats.reset(token)
+    return stats
+
+
+def record_conversion(seconds):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.convert_seconds += seconds
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def get_series(self):
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def render(self, name, label_names):
+        """Prometheus text format"""
+        lines = [f"# TYPE {name} histogram"]
+        for labels, (counts, total) in sorted(self.get_series().items()):
+            label_text = ",".join(f'{key}="{value}"' for key, value in zip(label_names, labels))
+            cumulative = 0
+            for bucket, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{bucket}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {total}")
+            lines.append(f"{name}_count{{{label_text}}} {cumulative}")
+        return "\n".join(lines)
+
+
+command_durations = Histogram()
+
+
+def get_shape(value):
+    """The command with every literal replaced by "?", so that slow queries group by structure"""
+    if isinstance(value, dict):
+        return {key: get_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [get_shape(item) for item in value]
+    return "?"
+
+
+def get_returned(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    return reply.get("n", 0)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    IGNORED = {"hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "killCursors"}
+    ENVELOPE = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "autocommit"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else "", event.command
+            )
+
+    def _finish(self, event, reply=None):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, command = pending
+        comment = command.get("comment")
+        record = CommandRecord(
+            command=event.command_name, collection=collection, duration_ms=event.duration_micros / 1000,
+            failed=reply is None, comment=comment if isinstance(comment, str) else None,
+        )
+        if reply is not None:
+            record.returned = get_returned(reply)
+            if RECORD_REPLY_SIZE:
+                record.reply_bytes = len(bson.encode(reply, codec_options=CODEC_OPTIONS))
+        command_durations.observe((record.label, record.collection), record.duration_ms)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.commands.append(record)
+        if record.duration_ms >= SLOW_QUERY_MS:
+            logger.warning(
+                "Slow mongo %s on %s: %.1fms, %s returned, %s bytes, shape %s", record.label, record.collection,
+                record.duration_ms, record.returned, record.reply_bytes,
+                get_shape({key: value for key, value in command.items() if key not in self.ENVELOPE})
+            )
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+command_listener = CommandMetricsListener()
+
+
+def render_metrics():
+    return command_durations.render("mongo_command_duration_ms", ("command", "collection")) + "\n"
+
@@ -0,0 +1,80 @@
+"""
+Keyset (seek) pagination. The sort values of the last row of a page are packed into an opaque token and the next
+page starts with a range $match on them, so page N costs the same as page 1 when the sort is backed by an index.
+The sort must end in a unique field and every sort field should hold a single BSON type besides null (or missing):
+Mongo's type bracketing means a range on a number never matches null or a string. Null sorts before every value, the
+matches say so explicitly.
+"""
+import base64
+import binascii
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+
+import bson
+from bson import ObjectId
+from bson.errors import BSONError
+
+from .codecs import CODEC_OPTIONS
+
+SORT_KEY_FIELD = "_sortKey"
+CURSOR_VALUE_TYPES = (type(None), bool, int, float, str, datetime, Decimal, ObjectId)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_sort_signature(sort_fields):
+    return hashlib.sha256(",".join(sort_fields).encode()).hexdigest()[:8]
+
+
+def encode_cursor(sort_fields, values):
+    data = bson.encode({"f": get_sort_signature(sort_fields), "v": list(values)}, codec_options=CODEC_OPTIONS)
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(token, sort_fields):
+    """Sort values of a token, it must have been issued for the same sort"""
+    try:
+        data = bson.decode(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)), codec_options=CODEC_OPTIONS)
+    except (BSONError, binascii.Error, ValueError):
+        raise InvalidCursor("Malformed pagination cursor")
+    if data.get("f") != get_sort_signature(sort_fields) or len(data.get("v", [])) != len(sort_fields):
+        raise InvalidCursor("Pagination cursor does not belong to this sort order")
+    values = data["v"]
+    if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise InvalidCursor("Pagination cursor holds unsupported values")
+    return values
+
+
+def get_after_condition(field, direction, value):
+    """Rows after `value` on one field, None when none can be: null is the lowest value in both directions"""
+    if value is None:
+        return None if direction == -1 else {field: {"$ne": None}}
+    if direction == -1:
+        return {"$or": [{field: {"$lt": value}}, {field: None}]}
+    return {field: {"$gt": value}}
+
+
+def get_keyset_match(sort: dict, values):
+    """Rows strictly after `values` in `sort` order: (a > x) or (a == x and b > y) or ..."""
+    clauses = []
+    equal = {}
+    for (field, direction), value in zip(sort.items(), values):
+        after = get_after_condition(field, direction, value)
+        if after is not None:
+            clauses.append({**equal, **after})
+        # {field: None} matches a missing field too, as the sort does
+        equal[field] = {"$eq": value}
+    # nothing is after nulls in a descending sort, and $or must not be empty
+    return {"$or": clauses} if clauses else {"_id": {"$exists": False}}
+
+
+def get_value(data, field):
+    for key in field.split("."):
+        try:
+            data = data[key]
+        except (KeyError, TypeError, IndexError):
+            return None
+    return data
@@ -0,0 +1,118 @@
+"""
+Stored ranking key. The listing signals of a document are folded into one number, weight * value summed over the
+signals, with weights per category. The key is computed in Python on insert and as an aggregation expression on
+update, so a write that touches a signal recomputes it in the same round trip (see MongoCollection.ranking).
+"""
+from bson import Decimal128
+
+
+class RankingEngine:
+    """
+    The default weights of VendorCollection are spaced so that the key orders like the old compound sort on
+    bhPartnerStatusValue, specialTagsValue, rating, verificationStatusValue, as long as no signal reaches the
+    smallest step of the one before it: specialTagsValue < 1000, rating < 1e6 with at most one decimal (a step of 0.1
+    weighs 100) and verificationStatusValue < 100. Any other weights turn it into a weighted score.
+    """
+
+    def __init__(self, weights, *, field="rankKey", category_field="businessCategory", category_weights=None):
+        self.weights = weights
+        self.field = field
+        self.category_field = category_field
+        self.category_weights = category_weights or {}
+
+    @property
+    def signal_fields(self):
+        fields = set(self.weights)
+        for weights in self.category_weights.values():
+            fields.update(weights)
+        if self.category_weights:
+            fields.add(self.category_field)
+        return fields
+
+    def get_weights(self, category=None):
+        return self.category_weights.get(category, self.weights)
+
+    @staticmethod
+    def get_number(value):
+        if isinstance(value, Decimal128):
+            value = value.to_decimal()
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def compute(self, document):
+        weights = self.get_weights(document.get(self.category_field))
+        return sum(weight * self.get_number(document.get(field)) for field, weight in weights.items())
+
+    @staticmethod
+    def get_weighted_sum(weights):
+        return {"$add": [
+            {"$multiply": [{"$convert": {"input": f"${field}", "to": "double", "onError": 0, "onNull": 0}}, weight]}
+            for field, weight in weights.items()
+        ]}
+
+    def get_expression(self):
+        if not self.category_weights:
+            return self.get_weighted_sum(self.weights)
+        return {"$switch": {
+            "branches": [
+                {"case": {"$eq": [f"${self.category_field}", category]}, "then": self.get_weighted_sum(weights)}
+                for category, weights in self.category_weights.items()
+            ],
+            "default": self.get_weighted_sum(self.weights),
+        }}
+
+    def get_stage(self):
+        return {"$set": {self.field: self.get_expression()}}
+
+    def is_affected(self, update):
+        """True when an update document writes one of the signal fields"""
+        signals = self.signal_fields
+        return any(key.split(".")[0] in signals for operation in update.values() for key in operation)
+
+    def to_pipeline(self, update):
+        """
+        The same update as an update pipeline that ends by recomputing the key, None for operators that have no
+        pipeline form ($setOnInsert, $inc, $push with modifiers other than $each ...) and for positional or array
+        index paths ("tags.$", "tags.$[]", "tags.0"), which a pipeline $set would write as object fields.
+        """
+        stages = []
+        for operator, fields in update.items():
+            if any(is_array_path(key) for key in fields):
+                return None
+            if operator == "$set":
+                stages.append({"$set": {key: {"$literal": value} for key, value in fields.items()}})
+            elif operator == "$unset":
+                stages.append({"$unset": list(fields)})
+            elif operator == "$push":
+                values = {}
+                for key, value in fields.items():
+                    if isinstance(value, dict) and any(name.startswith("$") for name in value):
+                        if set(value) != {"$each"}:
+                            return None
+                        value = value["$each"]
+                    else:
+                        value = [value]
+                    values[key] = {"$concatArrays": [{"$ifNull": [f"${key}", []]}, {"$literal": value}]}
+                stages.append({"$set": values})
+            else:
+                return None
+        stages.append(self.get_stage())
+        return stages
+
+
+def is_array_path(key):
+    return any(part.startswith("$") or part.isdigit() for part in key.split(".")[1:])
+
+
+def get_set_fields(update):
+    """Fields written by $set, for an update document as well as for a pipeline made by RankingEngine.to_pipeline"""
+    if isinstance(update, dict):
+        return update.get("$set", {})
+    fields = {}
+    for stage in update[:-1]:
+        for key, value in stage.get("$set", {}).items():
+            if isinstance(value, dict) and "$literal" in value:
+                fields[key] = value["$literal"]
+    return fields
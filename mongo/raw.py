@@ -0,0 +1,88 @@
+from collections.abc import MutableMapping
+
+from bson import Decimal128
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from .codecs import TYPE_REGISTRY
+from .utils import IST
+
+# pymongo encodes the command (filter, pipeline, keyset values) with these options too, so Decimal and date need the
+# registry; documents still decode one field at a time
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument, tz_aware=True, tzinfo=IST, type_registry=TYPE_REGISTRY)
+
+
+def to_python(value):
+    if isinstance(value, RawBSONDocument):
+        return LazyDocument(value)
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, list):
+        return [to_python(item) for item in value]
+    return value
+
+
+class LazyDocument(MutableMapping):
+    """
+    Mapping over a RawBSONDocument that decodes a field only when it is read.
+    Sub documents stay raw until they are read as well, assignments and deletes are kept aside from the raw bytes.
+    """
+    __slots__ = ("_raw", "_values", "_deleted")
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._values = {}
+        self._deleted = set()
+
+    @property
+    def raw(self):
+        return self._raw.raw
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._values[key] = to_python(self._raw[key])
+        return value
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._values.pop(key, None)
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._values or (key not in self._deleted and key in self._raw)
+
+    def __iter__(self):
+        for key in self._raw:
+            if key not in self._deleted:
+                yield key
+        for key in self._values:
+            if key not in self._raw:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"LazyDocument({self.to_dict()!r})"
+
+    def to_dict(self):
+        """Decode every field, e.g. before caching or mutating the document as a whole"""
+        return {key: self._to_dict(self[key]) for key in self}
+
+    @classmethod
+    def _to_dict(cls, value):
+        if isinstance(value, LazyDocument):
+            return value.to_dict()
+        if isinstance(value, list):
+            return [cls._to_dict(item) for item in value]
+        return value
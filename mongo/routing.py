@@ -0,0 +1,69 @@
+"""
+Read routing. Writes and find_one always go to the primary. Listing and count reads follow the read_route of the
+collection class or of the call: ReadRoute.SECONDARY reads from secondaryPreferred, skipping secondaries that lag
+more than max_staleness_seconds behind the primary.
+
+A request that reads what it just wrote runs in a causal session; every collection on the same client passes it to
+the driver, so a read inside the block sees the writes before it, even when it is served by a secondary. The client
+may be the pymongo client or what wraps it (MongoDBClient, utils.mongo_connection.LazyMongoConnection):
+
+    with causal_session(vendors.client):
+        vendors.update_one(filter={"vendorId": vendor_id}, update={"name": name})
+        vendors.aggregate(defaults=[{"vendorId": vendor_id}])
+"""
+import os
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from .enums import ReadRoute
+
+# 90 is the smallest staleness bound the drivers accept
+MAX_STALENESS_SECONDS = int(os.environ.get("MONGO_MAX_STALENESS_SECONDS", 90))
+
+current_session = ContextVar("mongo_causal_session", default=None)
+
+
+def get_read_preference(read_route, max_staleness_seconds=MAX_STALENESS_SECONDS):
+    if ReadRoute(read_route) == ReadRoute.SECONDARY:
+        return SecondaryPreferred(max_staleness=max_staleness_seconds)
+    return Primary()
+
+
+def get_mongo_client(client):
+    """The pymongo client under the MongoDBClient / LazyMongoConnection wrappers"""
+    while not isinstance(client, (MongoClient, AsyncMongoClient)):
+        client = client.client
+    return client
+
+
+def get_session(client):
+    """The causal session of the current context when it was started on `client`"""
+    session = current_session.get()
+    if session is not None and session.client is get_mongo_client(client):
+        return session
+    return None
+
+
+@contextmanager
+def causal_session(client):
+    session = get_mongo_client(client).start_session(causal_consistency=True)
+    token = current_session.set(session)
+    try:
+        yield session
+    finally:
+        current_session.reset(token)
+        session.end_session()
+
+
+@asynccontextmanager
+async def async_causal_session(client):
+    session = get_mongo_client(client).start_session(causal_consistency=True)
+    token = current_session.set(session)
+    try:
+        yield session
+    finally:
+        current_session.reset(token)
+        await session.end_session()
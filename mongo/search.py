@@ -0,0 +1,261 @@
+"""
+In process prefix index for search as you type. Names are normalized into terms (the whole name and every word of it
+onwards, so "royal palace" is found by "roy" and by "pal") kept in one sorted list per group (city). A lookup is a
+bisect to the first term with the prefix, so keystrokes never reach Mongo. Full queries use HelperCollection.search.
+"""
+import bisect
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+from .pagination import get_value
+
+logger = logging.getLogger(__name__)
+
+NON_WORD = re.compile(r"[^0-9a-z]+")
+WARM_PREFIX_CHARACTERS = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def normalize(text):
+    """Lower case ascii words separated by single spaces, accents removed"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return NON_WORD.sub(" ", text).strip()
+
+
+def get_terms(*texts):
+    terms = set()
+    for text in texts:
+        words = normalize(text).split()
+        terms.update(" ".join(words[index:]) for index in range(len(words)))
+    return terms
+
+
+@dataclass(frozen=True)
+class PrefixHit:
+    id: str
+    slug: str
+    name: str
+    score: float
+
+
+class PrefixIndex:
+    """
+    Sorted (term, -score, id) entries per group. add/remove keep the lists sorted, so a refresh only touches the
+    documents that changed. Results are memoized per group and prefix, a change drops only the prefixes of the terms
+    it touched. Short prefixes match most of a group, warm() computes them ahead of the first keystroke.
+    """
+
+    def __init__(self, memo_size=4096):
+        self.memo_size = memo_size
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._documents = {}
+        self._memo = {}
+
+    def _invalidate(self, group, terms):
+        memo = self._memo.get(group)
+        if memo:
+            for key in [key for key in memo if any(term.startswith(key[0]) for term in terms)]:
+                del memo[key]
+
+    def add(self, id, *, name, slug=None, group=None, score=0):
+        with self._lock:
+            self.remove(id)
+            hit = PrefixHit(id=id, slug=slug, name=name, score=score)
+            terms = get_terms(name, (slug or "").replace("-", " "))
+            entries = self._entries.setdefault(group, [])
+            for term in terms:
+                bisect.insort(entries, (term, -score, id))
+            self._documents[id] = (group, terms, hit)
+            self._invalidate(group, terms)
+
+    def add_many(self, documents):
+        """
+        add() for many (id, name, slug, group, score) documents at once: their entries are appended and every group
+        they touch is sorted once, instead of one insort per term
+        """
+        with self._lock:
+            touched = set()
+            for id, name, slug, group, score in documents:
+                self.remove(id)
+                hit = PrefixHit(id=id, slug=slug, name=name, score=score)
+                terms = get_terms(name, (slug or "").replace("-", " "))
+                self._entries.setdefault(group, []).extend((term, -score, id) for term in terms)
+                self._documents[id] = (group, terms, hit)
+                touched.add(group)
+            for group in touched:
+                self._entries[group].sort()
+                self._memo.pop(group, None)
+
+    def remove(self, id):
+        with self._lock:
+            document = self._documents.pop(id, None)
+            if document is None:
+                return
+            group, terms, hit = document
+            entries = self._entries[group]
+            for term in terms:
+                index = bisect.bisect_left(entries, (term, -hit.score, id))
+                if index < len(entries) and entries[index] == (term, -hit.score, id):
+                    entries.pop(index)
+            self._invalidate(group, terms)
+
+    def lookup(self, prefix, group=None, limit=10):
+        """Top `limit` documents, by score, having a term that starts with the prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        key = (prefix, limit)
+        hits = self._memo.get(group, {}).get(key)
+        if hits is not None:
+            return hits
+        with self._lock:
+            entries = self._entries.get(group, [])
+            index = bisect.bisect_left(entries, (prefix,))
+            end = bisect.bisect_left(entries, (prefix + "\x7f",), index)
+            best = {}
+            # a document has several terms, keep its best entry
+            for term, score, id in entries[index:end]:
+                if id not in best or score < best[id]:
+                    best[id] = score
+            hits = [self._documents[id][2] for id in heapq.nsmallest(limit, best, key=lambda id: (best[id], id))]
+            memo = self._memo.setdefault(group, {})
+            if len(memo) >= self.memo_size:
+                del memo[next(iter(memo))]
+            memo[key] = hits
+        return hits
+
+    def ids(self):
+        return set(self._documents)
+
+    def warm(self, length=2, limit=10):
+        """Memoizes every prefix of up to `length` characters in every group"""
+        prefixes = [""]
+        for _ in range(length):
+            prefixes = [prefix + character for prefix in prefixes for character in WARM_PREFIX_CHARACTERS]
+            for group in list(self._entries):
+                for prefix in prefixes:
+                    self.lookup(prefix, group, limit)
+
+    def __len__(self):
+        return len(self._documents)
+
+
+class CollectionPrefixIndex(PrefixIndex):
+    """
+    PrefixIndex over a MongoCollection. load() reads every document once, refresh() only the ones whose updatedAt
+    (stamped by every MongoCollection write) is newer than the last one seen; start() refreshes in a daemon thread.
+    Hard deletes leave no updatedAt behind, every prune_every refreshes the ids still in the collection are read and
+    the others are removed.
+
+        vendor_names = CollectionPrefixIndex(VendorCollection(connection=client), group_field="address.city",
+                                             score_field="gmapsUserRatingsCount", filter={"businessCategory": "VENUE"})
+        vendor_names.start(interval_in_seconds=30)
+        vendor_names.lookup("roy", group="Bengaluru")
+    """
+
+    def __init__(self, collection, *, id_field="vendorId", slug_field="urlSlug", name_field="name",
+                 group_field=None, score_field=None, filter=None, active_field="isActive", memo_size=4096,
+                 prune_every=10):
+        super().__init__(memo_size=memo_size)
+        self.collection = collection
+        self.id_field = id_field
+        self.slug_field = slug_field
+        self.name_field = name_field
+        self.group_field = group_field
+        self.score_field = score_field
+        self.filter = filter or {}
+        self.active_field = active_field
+        self.last_updated_at = None
+        self.prune_every = prune_every
+        self._refreshes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_projection(self):
+        fields = [self.id_field, self.slug_field, self.name_field, self.group_field, self.score_field,
+                  self.active_field, "updatedAt"]
+        return {field: 1 for field in fields if field}
+
+    def get_document(self, document):
+        """(id, name, slug, group, score) of a document, None when it has no id"""
+        id = get_value(document, self.id_field)
+        if id is None:
+            return None
+        return (
+            id,
+            get_value(document, self.name_field) or "",
+            get_value(document, self.slug_field) if self.slug_field else None,
+            get_value(document, self.group_field) if self.group_field else None,
+            (get_value(document, self.score_field) or 0) if self.score_field else 0,
+        )
+
+    def is_inactive(self, document):
+        return bool(self.active_field) and get_value(document, self.active_field) is False
+
+    def track_updated_at(self, document):
+        updated_at = document.get("updatedAt")
+        if updated_at is not None and (self.last_updated_at is None or updated_at > self.last_updated_at):
+            self.last_updated_at = updated_at
+
+    def apply(self, document):
+        entry = self.get_document(document)
+        if entry is None:
+            return
+        if self.is_inactive(document):
+            self.remove(entry[0])
+        else:
+            id, name, slug, group, score = entry
+            self.add(id, name=name, slug=slug, group=group, score=score)
+        self.track_updated_at(document)
+
+    def load(self):
+        documents = []
+        for document in self.collection.collection.find(self.filter, self.get_projection()):
+            entry = self.get_document(document)
+            if entry is not None and not self.is_inactive(document):
+                documents.append(entry)
+            self.track_updated_at(document)
+        self.add_many(documents)
+        logger.info("Prefix index on %s loaded %s documents", self.collection.collection.name, len(self))
+
+    def prune(self):
+        """Removes the documents deleted from the collection (or moved out of the filter)"""
+        existing = {
+            get_value(document, self.id_field)
+            for document in self.collection.collection.find(self.filter, {self.id_field: 1, "_id": 0})
+        }
+        for id in self.ids() - existing:
+            self.remove(id)
+
+    def refresh(self):
+        if self.last_updated_at is None:
+            return self.load()
+        query = {**self.filter, "updatedAt": {"$gte": self.last_updated_at}}
+        for document in self.collection.collection.find(query, self.get_projection()).sort("updatedAt", 1):
+            self.apply(document)
+        self._refreshes += 1
+        if self.prune_every and self._refreshes % self.prune_every == 0:
+            self.prune()
+
+    def _run(self, interval_in_seconds):
+        while not self._stop.wait(interval_in_seconds):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Prefix index refresh on %s failed", self.collection.collection.name)
+
+    def start(self, interval_in_seconds=60, warm_length=2):
+        """Loads the index now and keeps refreshing it, call it in every worker process after the fork"""
+        self.load()
+        self.warm(warm_length)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval_in_seconds,), daemon=True,
+                                            name="prefix-index-refresh")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
+
+from mongo.collection import VendorCollection
+
+
+class StubCollection:
+    """The part of a pymongo collection BulkWriter writes to, records every bulk_write"""
+    name = "vendor"
+
+    def __init__(self, write_errors=()):
+        self.batches = []
+        self.write_errors = list(write_errors)
+
+    def bulk_write(self, requests, ordered=True):
+        self.batches.append(requests)
+        details = {"nInserted": sum(not isinstance(request, UpdateOne) for request in requests),
+                   "nMatched": 0, "nModified": 0, "nUpserted": 0, "nRemoved": 0, "writeErrors": []}
+        if self.write_errors:
+            details["writeErrors"] = self.write_errors.pop(0)
+            raise BulkWriteError(details)
+        return BulkWriteResult(details, acknowledged=True)
+
+
+class BulkWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vendors = VendorCollection(connection=MongoClient("mongodb://localhost:27017/test", connect=False))
+        self.vendors.collection = StubCollection()
+
+    def test_flush_by_count(self):
+        with self.vendors.bulk_writer(max_operations=2) as writer:
+            for vendor_id in range(5):
+                writer.insert_one(document={"vendorId": vendor_id})
+            self.assertEqual([len(batch) for batch in self.vendors.collection.batches], [2, 2])
+        self.assertEqual([len(batch) for batch in self.vendors.collection.batches], [2, 2, 1])
+        self.assertEqual(writer.report.inserted, 5)
+
+    def test_flush_by_bytes(self):
+        with self.vendors.bulk_writer(max_bytes=2500) as writer:
+            for vendor_id in range(3):
+                writer.insert_one(document={"vendorId": vendor_id, "about": "x" * 1000})
+        # the third document would take the batch over 2500 bytes, it starts the next one
+        self.assertEqual([len(batch) for batch in self.vendors.collection.batches], [2, 1])
+
+    def test_flush_by_delay(self):
+        with mock.patch("mongo.bulk.time.monotonic", side_effect=[100.0, 100.5, 101.0, 101.0]):
+            writer = self.vendors.bulk_writer(max_delay_in_seconds=1.0)
+            writer.insert_one(document={"vendorId": 1})
+            self.assertEqual(self.vendors.collection.batches, [])
+            writer.insert_one(document={"vendorId": 2})
+        self.assertEqual([len(batch) for batch in self.vendors.collection.batches], [2])
+
+    def test_write_errors_map_to_the_queued_operations(self):
+        self.vendors.collection = StubCollection(write_errors=[[{"index": 1, "code": 11000, "errmsg": "duplicate"}]])
+        with self.vendors.bulk_writer() as writer:
+            operations = [writer.insert_one(document={"vendorId": vendor_id}) for vendor_id in range(3)]
+        self.assertEqual(len(writer.report.errors), 1)
+        operation, error = writer.report.errors[0]
+        self.assertIs(operation, operations[1])
+        self.assertEqual(operation.operation_params["document"]["vendorId"], 1)
+        self.assertEqual(error["code"], 11000)
+
+    def test_rank_refresh_follows_an_update_without_pipeline_form(self):
+        with self.vendors.bulk_writer() as writer:
+            writer.update_one(filter={"vendorId": 1}, update={"rating": 4},
+                              push={"reviews": {"$each": [{"rating": 4}], "$slice": -10}})
+            writer.update_one(filter={"vendorId": 2}, update={"rating": 3})
+        update_batch, refresh_batch = self.vendors.collection.batches
+        self.assertEqual(len(update_batch), 2)
+        self.assertEqual(refresh_batch, [UpdateOne({"vendorId": 1}, [self.vendors.ranking.get_stage()])])
@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+from pymongo import MongoClient
+
+from mongo.cache import CollectionVersions, ResultCache, TTLCache, get_collection_versions, get_query_key, \
+    set_collection_versions
+from mongo.collection import VendorCollection
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = TTLCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=10)
+        with mock.patch("mongo.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=30)
+        with mock.patch("mongo.cache.time.monotonic", return_value=115):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), 2)
+        with mock.patch("mongo.cache.time.monotonic", return_value=130):
+            self.assertIsNone(cache.get("b"))
+
+    def test_zero_ttl_is_not_cached(self):
+        cache = TTLCache()
+        cache.set("a", 1, ttl=0)
+        self.assertEqual(len(cache), 0)
+
+    def test_max_bytes(self):
+        cache = TTLCache(max_bytes=10, get_size=len)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        cache.set("c", b"123")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), b"123")
+        cache.set("d", b"12345678901")
+        self.assertIsNone(cache.get("d"))
+        cache.set("c", b"1")
+        cache.delete("b")
+        cache.set("e", b"123456789")
+        self.assertEqual((cache.get("c"), cache.get("e")), (b"1", b"123456789"))
+
+    def test_query_key_ignores_key_order(self):
+        self.assertEqual(get_query_key("vendor", {"a": 1, "b": {"c": 2, "d": 3}}),
+                         get_query_key("vendor", {"b": {"d": 3, "c": 2}, "a": 1}))
+        self.assertNotEqual(get_query_key("vendor", {"a": [1, 2]}), get_query_key("vendor", {"a": [2, 1]}))
+
+
+class ResultCacheKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        client = MongoClient("mongodb://localhost:27017/test", connect=False)
+        self.addCleanup(client.close)
+        self.vendors = VendorCollection(connection=client)
+        self.addCleanup(set_collection_versions, get_collection_versions())
+        set_collection_versions(CollectionVersions(single_process=True))
+
+    def get_key(self, sort_by, page=1):
+        return self.vendors.get_result_cache_key([{"isActive": True}], sort_by, page, 10, None, None, None)
+
+    def test_sort_order_is_part_of_the_key(self):
+        self.assertNotEqual(self.get_key({"a": 1, "b": -1}), self.get_key({"b": -1, "a": 1}))
+        self.assertEqual(self.get_key({"a": 1, "b": -1}), self.get_key({"a": 1, "b": -1}))
+        self.assertNotEqual(self.get_key(None), self.get_key(None, page=2))
+
+    def test_versions_are_part_of_the_key(self):
+        key = self.get_key(None)
+        get_collection_versions().bump("vendorMedia")
+        self.assertNotEqual(self.get_key(None), key)
+
+    def test_per_process_versions_are_refused(self):
+        set_collection_versions(CollectionVersions())
+        with self.assertRaises(RuntimeError):
+            self.get_key(None)
+
+    def test_result_cache_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ResultCache()
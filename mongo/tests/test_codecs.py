@@ -0,0 +1,40 @@
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import bson
+from bson import Decimal128
+
+from mongo.codecs import CODEC_OPTIONS, assert_tz_aware
+from mongo.utils import IST
+
+
+class CodecsTest(unittest.TestCase):
+
+    def round_trip(self, document):
+        return bson.decode(bson.encode(document, codec_options=CODEC_OPTIONS), codec_options=CODEC_OPTIONS)
+
+    def test_decimal_round_trip(self):
+        data = bson.encode({"price": Decimal("10.25")}, codec_options=CODEC_OPTIONS)
+        self.assertIsInstance(bson.decode(data)["price"], Decimal128)
+        self.assertEqual(self.round_trip({"price": Decimal("10.25")}), {"price": Decimal("10.25")})
+
+    def test_nested_decimals(self):
+        document = {"items": [{"price": Decimal("1.5")}, {"price": Decimal("2")}]}
+        self.assertEqual(self.round_trip(document), document)
+
+    def test_date_is_stored_as_midnight(self):
+        value = self.round_trip({"day": date(2024, 3, 1)})["day"]
+        self.assertEqual(value, datetime(2024, 3, 1, tzinfo=timezone.utc))
+
+    def test_datetimes_come_back_in_ist(self):
+        value = self.round_trip({"at": datetime(2024, 3, 1, 6, 30, tzinfo=timezone.utc)})["at"]
+        self.assertEqual(value.utcoffset(), timedelta(hours=5, minutes=30))
+        self.assertEqual((value.hour, value.minute), (12, 0))
+
+    def test_assert_tz_aware(self):
+        assert_tz_aware({"at": datetime.now(IST), "items": [{"at": datetime.now(timezone.utc)}]})
+        with self.assertRaises(Exception):
+            assert_tz_aware({"items": [{"at": datetime.now()}]})
+        with self.assertRaises(Exception):
+            assert_tz_aware([{"nested": {"at": datetime(2024, 1, 1)}}])
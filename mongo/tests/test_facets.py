@@ -0,0 +1,98 @@
+import unittest
+
+from mongo.facets import get_facet_counts, get_facet_stage
+
+DIMENSIONS = [
+    {"key": "city", "field": "address.city", "filters": []},
+    {"key": "ratings", "field": "gmapRatings", "exclusiveMin": True, "filters": [
+        {"id": "4", "label": "4+", "labelSlug": "4-plus", "min": 4},
+        {"id": "3", "label": "3+", "labelSlug": "3-plus", "min": 3},
+    ]},
+    {"key": "type", "field": "venueType", "filters": [
+        {"id": "indoor", "label": "Indoor", "labelSlug": "indoor", "filters": [
+            {"id": "hall", "label": "Hall", "labelSlug": "hall"},
+        ]},
+        {"id": "lawn", "label": "Lawn", "labelSlug": "lawn"},
+    ]},
+]
+
+
+def evaluate(expression, document):
+    """The aggregation expressions the range buckets are made of, with Mongo's cross type ordering for $gt/$gte"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    if operator == "$cond":
+        return evaluate(args[1] if evaluate(args[0], document) else args[2], document)
+    if operator == "$and":
+        return all(evaluate(arg, document) for arg in args)
+    if operator == "$isNumber":
+        value = evaluate(args, document)
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    left, right = (evaluate(arg, document) for arg in args)
+    # null < numbers < strings
+    left, right = (((value is not None) + isinstance(value, str), value if value is not None else 0)
+                   for value in (left, right))
+    if left[0] != right[0]:
+        left, right = left[0], right[0]
+    else:
+        left, right = left[1], right[1]
+    return {"$gt": left > right, "$gte": left >= right, "$lt": left < right}[operator]
+
+
+class FacetStageTest(unittest.TestCase):
+
+    def test_each_dimension_ignores_its_own_filter(self):
+        facets = get_facet_stage(DIMENSIONS, {"address.city": "Pune", "gmapRatings": {"$gt": 4}})["$facet"]
+        self.assertEqual(facets["city"][0], {"$match": {"gmapRatings": {"$gt": 4}}})
+        self.assertEqual(facets["ratings"][0], {"$match": {"address.city": "Pune"}})
+        self.assertEqual(facets["type"][0], {"$match": {"address.city": "Pune", "gmapRatings": {"$gt": 4}}})
+
+    def test_top_values(self):
+        pipeline = get_facet_stage(DIMENSIONS[:1], {})["$facet"]["city"]
+        self.assertEqual(pipeline[0], {"$project": {"_id": 0, "value": "$address.city"}})
+        self.assertEqual(pipeline[-1], {"$limit": 20})
+
+    def test_range_uses_the_filter_operator(self):
+        group = get_facet_stage(DIMENSIONS[1:2], {})["$facet"]["ratings"][0]["$group"]
+        self.assertEqual(group["c0"], {"$sum": {"$cond": [
+            {"$and": [{"$isNumber": "$gmapRatings"}, {"$gt": ["$gmapRatings", 4]}]}, 1, 0
+        ]}})
+        inclusive = {**DIMENSIONS[1], "exclusiveMin": False}
+        group = get_facet_stage([inclusive], {})["$facet"]["ratings"][0]["$group"]
+        self.assertEqual(group["c1"], {"$sum": {"$cond": [
+            {"$and": [{"$isNumber": "$gmapRatings"}, {"$gte": ["$gmapRatings", 3]}]}, 1, 0
+        ]}})
+
+    def test_range_skips_values_that_are_not_numbers(self):
+        group = get_facet_stage(DIMENSIONS[1:2], {})["$facet"]["ratings"][0]["$group"]
+        rows = [{"gmapRatings": 4.5}, {"gmapRatings": 3.5}, {"gmapRatings": ""}, {"gmapRatings": None}, {}]
+        self.assertEqual([sum(evaluate(group[name]["$sum"], row) for row in rows) for name in ("c0", "c1")], [1, 2])
+
+    def test_leaves_are_matched(self):
+        pipeline = get_facet_stage(DIMENSIONS[2:], {})["$facet"]["type"]
+        self.assertIn({"$match": {"value": {"$in": ["hall", "lawn"]}}}, pipeline)
+
+
+class FacetCountsTest(unittest.TestCase):
+
+    def test_counts_in_config_order_with_zeros(self):
+        result = {
+            "city": [{"_id": "Pune", "count": 7}, {"_id": "Mumbai", "count": 2}],
+            "ratings": [{"_id": None, "c0": 3, "c1": 5}],
+            "type": [{"_id": "lawn", "count": 4}],
+        }
+        counts = get_facet_counts(DIMENSIONS, result)
+        self.assertEqual([(row["id"], row["count"]) for row in counts["city"]], [("Pune", 7), ("Mumbai", 2)])
+        self.assertEqual(counts["ratings"], [
+            {"id": "4", "label": "4+", "labelSlug": "4-plus", "count": 3},
+            {"id": "3", "label": "3+", "labelSlug": "3-plus", "count": 5},
+        ])
+        self.assertEqual([(row["id"], row["count"]) for row in counts["type"]], [("hall", 0), ("lawn", 4)])
+
+    def test_empty_result(self):
+        counts = get_facet_counts(DIMENSIONS, None)
+        self.assertEqual(counts["city"], [])
+        self.assertEqual([row["count"] for row in counts["ratings"]], [0, 0])
@@ -0,0 +1,79 @@
+import base64
+import unittest
+from datetime import datetime, timezone
+
+import bson
+from bson import ObjectId
+
+from mongo.collection import QueryIterator
+from mongo.pagination import InvalidCursor, decode_cursor, encode_cursor, get_keyset_match, get_sort_signature
+
+SORT_FIELDS = ["rankKey", "createdAt", "vendorId"]
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = [12.5, datetime(2024, 1, 1, tzinfo=timezone.utc), ObjectId()]
+        self.assertEqual(decode_cursor(encode_cursor(SORT_FIELDS, values), SORT_FIELDS), values)
+
+    def test_null_round_trip(self):
+        values = [None, None, "v1"]
+        self.assertEqual(decode_cursor(encode_cursor(SORT_FIELDS, values), SORT_FIELDS), values)
+
+    def test_token_is_url_safe(self):
+        token = encode_cursor(SORT_FIELDS, ["a" * 50, None, 1])
+        self.assertNotIn("=", token)
+        self.assertTrue(all(char.isalnum() or char in "-_" for char in token))
+
+    def test_other_sort(self):
+        token = encode_cursor(SORT_FIELDS, [1, None, "v1"])
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token, ["rankKey", "vendorId"])
+
+    def test_malformed(self):
+        for token in ("", "not a cursor", "AAAA"):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token, SORT_FIELDS)
+
+    def test_unsupported_values(self):
+        data = bson.encode({"f": get_sort_signature(["a"]), "v": [{"$gt": 1}]})
+        token = base64.urlsafe_b64encode(data).decode().rstrip("=")
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token, ["a"])
+
+
+class KeysetMatchTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(get_keyset_match({"rankKey": -1, "vendorId": 1}, [5, "v1"]), {"$or": [
+            {"$or": [{"rankKey": {"$lt": 5}}, {"rankKey": None}]},
+            {"rankKey": {"$eq": 5}, "vendorId": {"$gt": "v1"}},
+        ]})
+
+    def test_null_ascending(self):
+        self.assertEqual(get_keyset_match({"rankKey": 1, "vendorId": 1}, [None, "v1"]), {"$or": [
+            {"rankKey": {"$ne": None}},
+            {"rankKey": {"$eq": None}, "vendorId": {"$gt": "v1"}},
+        ]})
+
+    def test_null_descending(self):
+        # nothing sorts after null in a descending sort, only the tie breaker can move on
+        self.assertEqual(get_keyset_match({"rankKey": -1, "vendorId": 1}, [None, "v1"]), {"$or": [
+            {"rankKey": {"$eq": None}, "vendorId": {"$gt": "v1"}},
+        ]})
+
+
+class NextCursorTest(unittest.TestCase):
+
+    def read(self, rows, limit):
+        iterator = QueryIterator(iter(rows), sort_fields=["rankKey", "vendorId"], limit=limit)
+        list(iterator)
+        return iterator
+
+    def test_full_page(self):
+        iterator = self.read([{"rankKey": 2, "vendorId": "a"}, {"rankKey": None, "vendorId": "b"}], limit=2)
+        self.assertEqual(decode_cursor(iterator.next_cursor, ["rankKey", "vendorId"]), [None, "b"])
+
+    def test_short_page(self):
+        self.assertIsNone(self.read([{"rankKey": 2, "vendorId": "a"}], limit=2).next_cursor)
@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from pymongo import AsyncMongoClient
+
+from mongo.async_collection import AsyncHelperCollection, AsyncQueryIterator
+from mongo.collection import QueryIterator
+
+
+class AsyncRows:
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self.closed = True
+
+
+class QueryIteratorSizeTest(unittest.TestCase):
+
+    def test_list_does_not_count(self):
+        size_function = mock.Mock(return_value=10 ** 8)
+        iterator = QueryIterator(iter([{"a": 1}, {"a": 2}]), size_function=size_function)
+        self.assertEqual(list(iterator), [{"a": 1}, {"a": 2}])
+        size_function.assert_not_called()
+
+    def test_size_is_counted_once(self):
+        size_function = mock.Mock(return_value=42)
+        iterator = QueryIterator(iter([]), size_function=size_function)
+        self.assertEqual((iterator.size, iterator.size), (42, 42))
+        size_function.assert_called_once_with()
+
+
+class AsyncQueryIteratorTest(unittest.TestCase):
+
+    def test_get_size(self):
+        size_function = mock.AsyncMock(return_value=7)
+        iterator = AsyncQueryIterator(AsyncRows([{"a": 1}]), size_function=size_function)
+        self.assertEqual(asyncio.run(iterator.to_list()), [{"a": 1}])
+        size_function.assert_not_called()
+        with self.assertRaises(TypeError):
+            iterator.size
+        self.assertEqual(asyncio.run(iterator.get_size()), 7)
+        self.assertEqual((iterator.size, asyncio.run(iterator.get_size())), (7, 7))
+        size_function.assert_awaited_once_with()
+
+    def test_find_with_size(self):
+        async def find():
+            client = AsyncMongoClient("mongodb://localhost:27017/test", connect=False)
+            try:
+                return AsyncHelperCollection(connection=client, collection_name="vendor").find(
+                    {"isActive": True}, defaults={"city": "Pune"}, with_size=True
+                )
+            finally:
+                await client.close()
+
+        size_function = asyncio.run(find()).size_function
+        self.assertEqual(size_function.args, ({"isActive": True, "city": "Pune"},))
+
+    def test_close_awaits_the_cursor(self):
+        rows = AsyncRows([{"a": 1}])
+        asyncio.run(AsyncQueryIterator(rows).close())
+        self.assertTrue(rows.closed)
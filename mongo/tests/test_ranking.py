@@ -0,0 +1,87 @@
+import itertools
+import random
+import unittest
+
+from bson import Decimal128
+
+from mongo.collection import VendorCollection
+from mongo.ranking import RankingEngine, get_set_fields, is_array_path
+
+SIGNALS = ("bhPartnerStatusValue", "specialTagsValue", "rating", "verificationStatusValue")
+
+
+class ComputeTest(unittest.TestCase):
+    ranking = VendorCollection.ranking
+
+    def assert_orders_like_the_compound_sort(self, documents):
+        by_key = sorted(documents, key=self.ranking.compute, reverse=True)
+        by_signals = sorted(documents, key=lambda document: [document[field] for field in SIGNALS], reverse=True)
+        self.assertEqual([[document[field] for field in SIGNALS] for document in by_key],
+                         [[document[field] for field in SIGNALS] for document in by_signals])
+
+    def test_documented_limits(self):
+        values = ([0, 1, 2], [0, 1, 998, 999], [0, 0.1, 4.9, 5, 999999.8, 999999.9], [0, 1, 98, 99])
+        self.assert_orders_like_the_compound_sort([dict(zip(SIGNALS, combination))
+                                                   for combination in itertools.product(*values)])
+
+    def test_random_documents(self):
+        random.seed(7)
+        self.assert_orders_like_the_compound_sort([{
+            "bhPartnerStatusValue": random.randint(0, 3), "specialTagsValue": random.randint(0, 999),
+            "rating": random.randint(0, 50) / 10, "verificationStatusValue": random.randint(0, 99),
+        } for _ in range(2000)])
+
+    def test_values(self):
+        ranking = RankingEngine({"rating": 10, "count": 1}, category_weights={"NGO": {"count": 2}})
+        self.assertEqual(ranking.compute({"rating": Decimal128("4.5"), "count": "3"}), 48)
+        self.assertEqual(ranking.compute({"rating": None, "count": "many"}), 0)
+        self.assertEqual(ranking.compute({"businessCategory": "NGO", "rating": 5, "count": 3}), 6)
+        self.assertEqual(ranking.signal_fields, {"rating", "count", "businessCategory"})
+
+
+class ToPipelineTest(unittest.TestCase):
+    ranking = RankingEngine({"rating": 1, "tags": 1})
+
+    def test_set_unset_push(self):
+        pipeline = self.ranking.to_pipeline({
+            "$set": {"rating": 4, "address.city": "Pune"},
+            "$unset": {"oldField": ""},
+            "$push": {"tags": {"$each": ["a", "b"]}, "media": {"url": "x"}},
+        })
+        self.assertEqual(pipeline[:3], [
+            {"$set": {"rating": {"$literal": 4}, "address.city": {"$literal": "Pune"}}},
+            {"$unset": ["oldField"]},
+            {"$set": {
+                "tags": {"$concatArrays": [{"$ifNull": ["$tags", []]}, {"$literal": ["a", "b"]}]},
+                "media": {"$concatArrays": [{"$ifNull": ["$media", []]}, {"$literal": [{"url": "x"}]}]},
+            }},
+        ])
+        self.assertEqual(pipeline[-1], self.ranking.get_stage())
+
+    def test_no_pipeline_form(self):
+        for update in ({"$inc": {"rating": 1}}, {"$setOnInsert": {"rating": 1}},
+                       {"$push": {"tags": {"$each": ["a"], "$slice": -5}}},
+                       {"$set": {"tags.$": "a"}}, {"$set": {"tags.$[item]": "a"}}, {"$unset": {"tags.0": ""}},
+                       {"$push": {"media.1.tags": "a"}}):
+            self.assertIsNone(self.ranking.to_pipeline(update), update)
+
+    def test_is_affected(self):
+        self.assertTrue(self.ranking.is_affected({"$set": {"rating": 1}}))
+        self.assertTrue(self.ranking.is_affected({"$push": {"tags.0": 1}}))
+        self.assertFalse(self.ranking.is_affected({"$set": {"name": "x"}}))
+
+
+class PathsTest(unittest.TestCase):
+
+    def test_is_array_path(self):
+        for key in ("tags.$", "tags.$[]", "tags.$[item].name", "media.0", "media.10.url"):
+            self.assertTrue(is_array_path(key), key)
+        for key in ("tags", "address.city", "$set", "a1.b2"):
+            self.assertFalse(is_array_path(key), key)
+
+    def test_get_set_fields(self):
+        update = {"$set": {"rating": 4, "name": "x"}, "$unset": {"old": ""}}
+        self.assertEqual(get_set_fields(update), {"rating": 4, "name": "x"})
+        ranking = RankingEngine({"rating": 1})
+        self.assertEqual(get_set_fields(ranking.to_pipeline({**update, "$push": {"tags": "a"}})),
+                         {"rating": 4, "name": "x"})
@@ -0,0 +1,30 @@
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import bson
+
+from mongo.codecs import CODEC_OPTIONS
+from mongo.pagination import decode_cursor, encode_cursor, get_keyset_match
+from mongo.raw import RAW_CODEC_OPTIONS, LazyDocument
+
+
+class RawCodecOptionsTest(unittest.TestCase):
+
+    def test_filters_with_decimal_and_date_encode(self):
+        query = {"price": {"$gte": Decimal("1.5")}, "eventDate": {"$lt": date(2024, 5, 1)}}
+        data = bson.encode(query, codec_options=RAW_CODEC_OPTIONS)
+        self.assertEqual(bson.decode(data, codec_options=CODEC_OPTIONS), {
+            "price": {"$gte": Decimal("1.5")}, "eventDate": {"$lt": datetime(2024, 5, 1, tzinfo=timezone.utc)}
+        })
+
+    def test_keyset_match_of_decimal_sort_values(self):
+        values = decode_cursor(encode_cursor(["price", "vendorId"], [Decimal("10.5"), "v1"]), ["price", "vendorId"])
+        bson.encode({"$match": get_keyset_match({"price": -1, "vendorId": 1}, values)}, codec_options=RAW_CODEC_OPTIONS)
+
+    def test_documents_decode_lazily(self):
+        data = bson.encode({"price": Decimal("2.25"), "address": {"city": "Pune"}}, codec_options=CODEC_OPTIONS)
+        document = LazyDocument(bson.decode(data, codec_options=RAW_CODEC_OPTIONS))
+        self.assertEqual(document["price"], Decimal("2.25"))
+        self.assertEqual(document["address"]["city"], "Pune")
+        self.assertEqual(document.raw, data)
@@ -0,0 +1,33 @@
+import unittest
+
+from pymongo import MongoClient
+
+from mongo.mongo import MongoDBClient
+from mongo.routing import causal_session, get_mongo_client, get_session
+
+
+class CausalSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mongo_client = MongoClient("mongodb://localhost:27017/test", connect=False)
+        self.addCleanup(self.mongo_client.close)
+        self.client = MongoDBClient(connection=self.mongo_client)
+
+    def test_get_mongo_client_unwraps(self):
+        self.assertIs(get_mongo_client(self.mongo_client), self.mongo_client)
+        self.assertIs(get_mongo_client(self.client), self.mongo_client)
+        self.assertIs(get_mongo_client(MongoDBClient(connection=self.client)), self.mongo_client)
+
+    def test_session_of_wrapped_client(self):
+        self.assertIsNone(get_session(self.client))
+        with causal_session(self.client) as session:
+            self.assertIs(session.client, self.mongo_client)
+            self.assertIs(get_session(self.client), session)
+            self.assertIs(get_session(self.mongo_client), session)
+        self.assertIsNone(get_session(self.client))
+
+    def test_session_of_other_client(self):
+        other = MongoClient("mongodb://localhost:27017/test", connect=False)
+        self.addCleanup(other.close)
+        with causal_session(other):
+            self.assertIsNone(get_session(self.client))
@@ -0,0 +1,113 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from mongo.search import CollectionPrefixIndex, PrefixIndex, get_terms, normalize
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class ListCursor(list):
+
+    def sort(self, key, direction=1):
+        return ListCursor(sorted(self, key=lambda document: document[key], reverse=direction == -1))
+
+
+class ListCollection:
+    """The part of a pymongo collection CollectionPrefixIndex reads, over a list of documents"""
+    name = "vendor"
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, filter, projection):
+        documents = [document for document in self.documents
+                     if all(document.get(key) == value for key, value in filter.items() if key != "updatedAt")]
+        if "updatedAt" in filter:
+            documents = [document for document in documents if document["updatedAt"] >= filter["updatedAt"]["$gte"]]
+        return ListCursor(dict(document) for document in documents)
+
+
+class ListMongoCollection:
+
+    def __init__(self, documents):
+        self.collection = ListCollection(documents)
+
+
+class TermsTest(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  Café  Royal-Palace! "), "cafe royal palace")
+
+    def test_every_word_onwards(self):
+        self.assertEqual(get_terms("Royal Palace Hall", "royal palace"),
+                         {"royal palace hall", "palace hall", "hall", "royal palace", "palace"})
+
+
+class PrefixIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.add("1", name="Royal Palace", slug="royal-palace", group="Pune", score=10)
+        self.index.add("2", name="Royal Orchid", group="Pune", score=50)
+        self.index.add("3", name="Palace Grounds", group="Pune", score=30)
+        self.index.add("4", name="Royal Gardens", group="Mumbai", score=90)
+
+    def ids(self, prefix, group="Pune", limit=10):
+        return [hit.id for hit in self.index.lookup(prefix, group, limit)]
+
+    def test_lookup_by_score(self):
+        self.assertEqual(self.ids("roy"), ["2", "1"])
+        self.assertEqual(self.ids("pal"), ["3", "1"])
+        self.assertEqual(self.ids("Roy", limit=1), ["2"])
+        self.assertEqual(self.ids("roy", group="Mumbai"), ["4"])
+        self.assertEqual(self.ids(""), [])
+
+    def test_remove_and_update_drop_memoized_prefixes(self):
+        self.assertEqual(self.ids("roy"), ["2", "1"])
+        self.index.remove("2")
+        self.assertEqual(self.ids("roy"), ["1"])
+        self.index.add("1", name="Grand Palace", group="Pune", score=10)
+        self.assertEqual(self.ids("roy"), [])
+        self.assertEqual(self.ids("gra"), ["1"])
+        self.assertEqual(len(self.index), 3)
+
+    def test_add_many_matches_add(self):
+        documents = [("1", "Royal Palace", "royal-palace", "Pune", 10), ("2", "Royal Orchid", None, "Pune", 50),
+                     ("3", "Palace Grounds", None, "Pune", 30), ("4", "Royal Gardens", None, "Mumbai", 90)]
+        index = PrefixIndex()
+        index.add_many(documents)
+        self.assertEqual(index._entries, self.index._entries)
+        index.add_many([("2", "Orchid", None, "Pune", 50)])
+        self.assertEqual([hit.id for hit in index.lookup("roy", "Pune")], ["1"])
+
+
+class CollectionPrefixIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.documents = [
+            {"vendorId": "1", "name": "Royal Palace", "urlSlug": "royal-palace", "isActive": True, "updatedAt": NOW},
+            {"vendorId": "2", "name": "Royal Orchid", "urlSlug": "royal-orchid", "isActive": False, "updatedAt": NOW},
+        ]
+        self.index = CollectionPrefixIndex(ListMongoCollection(self.documents), prune_every=2)
+        self.index.refresh()
+
+    def ids(self, prefix):
+        return [hit.id for hit in self.index.lookup(prefix)]
+
+    def test_load_skips_inactive(self):
+        self.assertEqual(self.ids("roy"), ["1"])
+        self.assertEqual(self.index.last_updated_at, NOW)
+
+    def test_refresh_applies_updates(self):
+        self.documents[1].update(isActive=True, updatedAt=NOW + timedelta(minutes=1))
+        self.documents[0].update(isActive=False, updatedAt=NOW + timedelta(minutes=1))
+        self.index.refresh()
+        self.assertEqual(self.ids("roy"), ["2"])
+        self.assertEqual(self.index.last_updated_at, NOW + timedelta(minutes=1))
+
+    def test_refresh_prunes_deleted_documents(self):
+        del self.documents[0]
+        self.index.refresh()
+        self.assertEqual(self.ids("roy"), ["1"])
+        self.index.refresh()
+        self.assertEqual(self.ids("roy"), [])
@@ -0,0 +1,59 @@
+import unittest
+
+from mongo.tracking import TrackedDocument
+
+
+class TrackedDocumentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.document = TrackedDocument({
+            "vendorId": "v1",
+            "name": "Old",
+            "address": {"city": "Pune", "pin": "411001"},
+            "tags": ["a"],
+            "media": [{"url": "x"}],
+        })
+
+    def test_unchanged(self):
+        self.assertFalse(self.document.has_changes)
+        self.assertEqual(self.document.get_changes(), {"set": {}, "unset": {}, "push": {}})
+
+    def test_nested_leaf_is_a_dotted_set(self):
+        self.document["address"]["city"] = "Mumbai"
+        self.document["name"] = "New"
+        self.assertEqual(self.document.get_changes()["set"], {"address.city": "Mumbai", "name": "New"})
+
+    def test_removed_leaf_and_sub_document(self):
+        del self.document["address"]["pin"]
+        self.assertEqual(self.document.get_changes()["unset"], {"address.pin": ""})
+        del self.document["address"]
+        self.assertEqual(self.document.get_changes()["unset"], {"address": ""})
+
+    def test_append_is_a_push(self):
+        self.document["tags"].extend(["b", "c"])
+        self.assertEqual(self.document.get_changes(), {"set": {}, "unset": {}, "push": {"tags": {"$each": ["b", "c"]}}})
+
+    def test_other_list_change_is_a_set(self):
+        self.document["tags"] = ["b"]
+        self.assertEqual(self.document.get_changes()["set"], {"tags": ["b"]})
+
+    def test_leaf_replaced_by_sub_document(self):
+        self.document["name"] = {"first": "A", "last": "B"}
+        self.document["address"] = "Pune"
+        changes = self.document.get_changes()
+        self.assertEqual(changes["set"], {"name": {"first": "A", "last": "B"}, "address": "Pune"})
+        self.assertEqual(changes["unset"], {})
+
+    def test_type_change_is_a_set(self):
+        self.document["vendorId"] = 1
+        self.document["flag"] = True
+        self.assertEqual(self.document.get_changes()["set"], {"vendorId": 1, "flag": True})
+
+    def test_mark_clean(self):
+        self.document["name"] = "New"
+        self.document.mark_clean()
+        self.assertFalse(self.document.has_changes)
+
+    def test_snapshot_is_a_deep_copy(self):
+        self.document["media"][0]["url"] = "y"
+        self.assertEqual(self.document.get_changes()["set"], {"media": [{"url": "y"}]})
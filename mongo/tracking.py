@@ -0,0 +1,86 @@
+import copy
+
+from .mongo import MongoDBClient
+
+
+def get_path(data, path):
+    for key in path.split("."):
+        data = data[key]
+    return data
+
+
+def has_path(data, path):
+    try:
+        get_path(data, path)
+    except (KeyError, TypeError):
+        return False
+    return True
+
+
+def get_parent_paths(path):
+    parts = path.split(".")
+    return [".".join(parts[:index]) for index in range(1, len(parts))]
+
+
+class TrackedDocument(dict):
+    """
+    dict returned by find/find_one(tracked=True). It keeps a snapshot of what was read and turns the difference into the
+    smallest update: changed leaves as dotted $set paths, removed leaves as $unset and list appends as $push/$each.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._snapshot = copy.deepcopy(dict(self))
+
+    def mark_clean(self):
+        self._snapshot = copy.deepcopy(dict(self))
+
+    @property
+    def has_changes(self):
+        return any(self.get_changes().values())
+
+    def get_changes(self):
+        old = MongoDBClient.flatten(self._snapshot, keep_empty=True)
+        new = MongoDBClient.flatten(self, keep_empty=True)
+        to_set, to_unset, to_push = {}, {}, {}
+
+        # A leaf that became a sub document (or the other way round) is replaced as a whole at the old leaf
+        replaced = set()
+        for key in new:
+            for parent in get_parent_paths(key):
+                if parent in old:
+                    replaced.add(parent)
+                    break
+        for key in old:
+            for parent in get_parent_paths(key):
+                if parent in new:
+                    replaced.add(parent)
+                    break
+        for key in replaced:
+            to_set[key] = get_path(self, key)
+
+        def is_replaced(path):
+            return path in replaced or any(parent in replaced for parent in get_parent_paths(path))
+
+        for key, value in new.items():
+            if is_replaced(key):
+                continue
+            if key not in old:
+                to_set[key] = value
+                continue
+            old_value = old[key]
+            if value == old_value and type(value) is type(old_value):
+                continue
+            if isinstance(value, list) and isinstance(old_value, list) and \
+                    len(value) > len(old_value) and value[:len(old_value)] == old_value:
+                to_push[key] = {"$each": value[len(old_value):]}
+            else:
+                to_set[key] = value
+
+        for key in old:
+            if key not in new and not is_replaced(key):
+                # unset the whole sub document when it is gone, not each of its leaves
+                missing = next((parent for parent in get_parent_paths(key) if not has_path(self, parent)), key)
+                to_unset[missing] = ""
+
+        return {"set": to_set, "unset": to_unset, "push": to_push}
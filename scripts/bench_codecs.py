@@ -0,0 +1,108 @@
+"""
+Compares the recursive MongoDBClient.python_to_bson / bson_to_python walk with the bson codecs in mongo.codecs.
+
+Usage:
+    python -m scripts.bench_codecs --documents 30 --rounds 2000
+"""
+import argparse
+import copy
+import random
+import timeit
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+import bson
+from bson.codec_options import CodecOptions
+
+from mongo.codecs import CODEC_OPTIONS
+from mongo.mongo import MongoDBClient
+from mongo.utils import IST, get_random_string
+
+LEGACY_CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=IST)
+
+
+def get_vendor_document(index):
+    """Shape of a vendor listing row after the vendorMedia $lookup"""
+    created_at = datetime.now(IST) - timedelta(days=random.randint(1, 900))
+    return {
+        "vendorId": get_random_string(16),
+        "urlSlug": f"vendor-{index}",
+        "name": f"Vendor {index}",
+        "businessCategory": random.choice(["VENUE", "DECORATION", "PHOTOGRAPHY"]),
+        "formattedAddress": "12, 80 Feet Road, Koramangala, Bengaluru, Karnataka 560034",
+        "address": {
+            "city": "Bengaluru",
+            "citySlug": "bengaluru",
+            "locality": "Koramangala",
+            "pincode": "560034",
+        },
+        "geoJsonCoordinates": {"type": "Point", "coordinates": [77.62 + random.random() / 10, 12.93]},
+        "gmapRatings": Decimal(str(round(random.uniform(3, 5), 1))),
+        "gmapsUserRatingsCount": random.randint(0, 5000),
+        "perPlateCost": Decimal(random.randint(400, 3000)),
+        "perDayCost": Decimal(random.randint(50000, 500000)),
+        "indoorPrice": Decimal(random.randint(10000, 90000)),
+        "outdoorPrice": Decimal(random.randint(10000, 90000)),
+        "areasAvailable": [
+            {"name": f"Hall {i}", "capacity": random.randint(50, 1500), "price": Decimal(random.randint(1000, 9000))}
+            for i in range(4)
+        ],
+        "specialTags": ["BH_PARTNER", "TRENDING"],
+        "bhPartnerStatus": random.choice([True, False]),
+        "availableFrom": date.today(),
+        "vm": [
+            {
+                "mediaId": get_random_string(12),
+                "mediaUrl": f"vendors/{index}/{i}.jpg",
+                "mimeType": "image/jpeg",
+                "priority": i,
+                "isActive": True,
+                "mediaType": "IMAGE",
+                "createdAt": created_at,
+            }
+            for i in range(12)
+        ],
+        "createdAt": created_at,
+        "updatedAt": created_at,
+    }
+
+
+def run(documents, rounds):
+    vendors = [get_vendor_document(i) for i in range(documents)]
+    # python_to_bson converts nested values in place, so the recursive path gets a fresh copy per round
+    legacy_pages = [copy.deepcopy(vendors) for _ in range(rounds)]
+    encoded = [bson.encode(vendor, codec_options=CODEC_OPTIONS) for vendor in vendors]
+
+    def legacy_encode():
+        for vendor in legacy_pages.pop():
+            bson.encode(MongoDBClient.python_to_bson(vendor), codec_options=LEGACY_CODEC_OPTIONS)
+
+    def codec_encode():
+        for vendor in vendors:
+            bson.encode(vendor, codec_options=CODEC_OPTIONS)
+
+    def legacy_decode():
+        for raw in encoded:
+            MongoDBClient.bson_to_python(bson.decode(raw, codec_options=LEGACY_CODEC_OPTIONS))
+
+    def codec_decode():
+        for raw in encoded:
+            bson.decode(raw, codec_options=CODEC_OPTIONS)
+
+    results = {}
+    for name, func in (("encode/recursive", legacy_encode), ("encode/codec", codec_encode),
+                       ("decode/recursive", legacy_decode), ("decode/codec", codec_decode)):
+        results[name] = timeit.timeit(func, number=rounds) / (rounds * documents) * 1e6
+
+    for name, micro_seconds in results.items():
+        print(f"{name:<18} {micro_seconds:8.2f} us/document")
+    print(f"encode speedup     {results['encode/recursive'] / results['encode/codec']:8.2f}x")
+    print(f"decode speedup     {results['decode/recursive'] / results['decode/codec']:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=30, help="documents per listing page")
+    parser.add_argument("--rounds", type=int, default=500)
+    options = parser.parse_args()
+    run(options.documents, options.rounds)
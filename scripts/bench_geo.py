@@ -0,0 +1,108 @@
+"""
+Nearest vendors two ways against a scratch database: the current path (page through the city listing and sort by
+distance in Python) and VendorCollection.aggregate_near ($geoNear on the 2dsphere index).
+
+Usage:
+    python -m scripts.bench_geo --connection-string mongodb://localhost:27017/bench_geo --vendors 20000
+"""
+import argparse
+import math
+import random
+import time
+
+from mongo.collection import VendorCollection
+from mongo.enums import CountStrategy
+from mongo.indexes import get_index_specs, sync_indexes
+from scripts.bench_codecs import get_vendor_document
+
+CITIES = {
+    "Bengaluru": (77.59, 12.97),
+    "Mumbai": (72.88, 19.08),
+    "Delhi": (77.21, 28.61),
+    "Chennai": (80.27, 13.08),
+    "Hyderabad": (78.49, 17.39),
+}
+
+
+def get_distance_in_meters(longitude, latitude, coordinates):
+    """Haversine distance, what a client does with the coordinates of the listing"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (longitude, latitude, *coordinates))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6378100 * math.asin(math.sqrt(a))
+
+
+def seed(vendors, count):
+    vendors.collection.drop()
+    sync_indexes(vendors.get_default_database(), get_index_specs([VendorCollection]))
+    vendors.collection.create_index([("address.city", 1), ("businessCategory", 1)])
+    documents = []
+    for index in range(count):
+        document = get_vendor_document(index)
+        document.pop("vm")
+        city = random.choice(list(CITIES))
+        longitude, latitude = CITIES[city]
+        document["businessCategory"] = "VENUE"
+        # listing sort fields, a null sort value ends keyset pagination
+        document.update(bhPartnerStatusValue=random.randint(0, 1), specialTagsValue=random.randint(0, 2),
+                        rating=random.randint(0, 50), verificationStatusValue=random.randint(0, 1))
+        document["address"]["city"] = city
+        document[VendorCollection.ranking.field] = VendorCollection.ranking.compute(document)
+        document["geoJsonCoordinates"]["coordinates"] = [
+            longitude + random.uniform(-0.25, 0.25), latitude + random.uniform(-0.25, 0.25)
+        ]
+        documents.append(document)
+        if len(documents) == 1000:
+            vendors.collection.insert_many(documents)
+            documents = []
+    if documents:
+        vendors.collection.insert_many(documents)
+
+
+def nearest_by_city(vendors, city, longitude, latitude, limit):
+    rows, after = [], None
+    while True:
+        page = vendors.aggregate(defaults=[{"address.city": city}], limit=vendors.MaxPerPageLimit, after=after,
+                                 count_strategy=CountStrategy.NONE)
+        rows.extend(page)
+        after = page.next_cursor
+        if after is None:
+            break
+    rows.sort(key=lambda row: get_distance_in_meters(longitude, latitude, row["coordinates"]))
+    return rows[:limit], len(rows)
+
+
+def nearest_by_geo(vendors, longitude, latitude, radius, limit):
+    rows = list(vendors.aggregate_near(longitude, latitude, radius, limit=limit, count_strategy=CountStrategy.NONE))
+    return rows, len(rows)
+
+
+def timed(func, rounds):
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - started_at) / rounds * 1000, result
+
+
+def run(connection_string, count, rounds, radius, limit, skip_seed):
+    vendors = VendorCollection(connection_string=connection_string, collection_name="vendor")
+    if not skip_seed:
+        seed(vendors, count)
+    city = "Bengaluru"
+    longitude, latitude = CITIES[city]
+    city_ms, (_, city_rows) = timed(lambda: nearest_by_city(vendors, city, longitude, latitude, limit), rounds)
+    geo_ms, (_, geo_rows) = timed(lambda: nearest_by_geo(vendors, longitude, latitude, radius, limit), rounds)
+    print(f"city listing + sort   {city_ms:9.2f} ms/query  {city_rows} rows read")
+    print(f"$geoNear {radius:>6}m      {geo_ms:9.2f} ms/query  {geo_rows} rows read")
+    print(f"speedup               {city_ms / geo_ms:9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connection-string", default="mongodb://localhost:27017/bench_geo")
+    parser.add_argument("--vendors", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--radius", type=int, default=5000, help="meters")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--skip-seed", action="store_true")
+    options = parser.parse_args()
+    run(options.connection_string, options.vendors, options.rounds, options.radius, options.limit, options.skip_seed)
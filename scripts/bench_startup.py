@@ -0,0 +1,132 @@
+"""
+Cold start of a worker: import time per module (python -X importtime, one fresh interpreter per module) and the time
+to the first response of HarperFoundation.wsgi.application, each the median of a few runs.
+
+Usage:
+    python -m scripts.bench_startup --rounds 5 --top 15
+    python -m scripts.bench_startup --module mongo.collection --max-import-ms mongo.collection=150
+
+--max-import-ms and --max-first-response-ms exit with status 1 when a median is over its budget, for CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["mongo", "mongo.collection", "utils", "base.views", "HarperFoundation.wsgi"]
+
+FIRST_RESPONSE_CODE = """
+import json, time
+started_at = time.perf_counter()
+from HarperFoundation.wsgi import application
+imported_at = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {"PATH_INFO": %r, "REQUEST_METHOD": "GET"}
+setup_testing_defaults(environ)
+statuses = []
+body = b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+responded_at = time.perf_counter()
+print(json.dumps({"import_ms": (imported_at - started_at) * 1000, "response_ms": (responded_at - imported_at) * 1000,
+                  "total_ms": (responded_at - started_at) * 1000, "status": statuses[0]}))
+"""
+
+
+def get_env():
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "HarperFoundation.settings")
+    return env
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from the -X importtime report"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def import_times(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=get_env(),
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def first_response(path):
+    result = subprocess.run([sys.executable, "-c", FIRST_RESPONSE_CODE % path], env=get_env(),
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"first response failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def interpreter_start(rounds):
+    """Median ms and the modules of a bare interpreter start, the floor under every import measured after it"""
+    timings, modules = [], set()
+    for _ in range(rounds):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+        times = parse_importtime(result.stderr)
+        timings.append(sum(self_us for self_us, _ in times.values()) / 1000)
+        modules.update(times)
+    return statistics.median(timings), modules
+
+
+def report_module(module, rounds, top, startup_modules):
+    runs = [import_times(module) for _ in range(rounds)]
+    cumulative_ms = statistics.median(run[module][1] for run in runs) / 1000
+    self_ms = {name: statistics.median(run.get(name, (0, 0))[0] for run in runs) / 1000
+               for name in runs[0] if name not in startup_modules}
+    print(f"\nimport {module}: {cumulative_ms:.1f} ms, {len(self_ms)} modules")
+    for name, value in sorted(self_ms.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {value:8.2f} ms  {name}")
+    return cumulative_ms
+
+
+def parse_budgets(values):
+    budgets = {}
+    for value in values or []:
+        module, _, ms = value.rpartition("=")
+        budgets[module] = float(ms)
+    return budgets
+
+
+def run(modules, rounds, top, path, import_budgets, first_response_budget):
+    failures = []
+    startup_ms, startup_modules = interpreter_start(rounds)
+    print(f"interpreter start: {startup_ms:.1f} ms, {len(startup_modules)} modules")
+    for module in modules:
+        cumulative_ms = report_module(module, rounds, top, startup_modules)
+        if module in import_budgets and cumulative_ms > import_budgets[module]:
+            failures.append(f"import {module} {cumulative_ms:.1f} ms > {import_budgets[module]} ms")
+
+    responses = [first_response(path) for _ in range(rounds)]
+    medians = {key: statistics.median(response[key] for response in responses)
+               for key in ("import_ms", "response_ms", "total_ms")}
+    print(f"\nfirst response GET {path} ({responses[0]['status']}): import {medians['import_ms']:.1f} ms + "
+          f"response {medians['response_ms']:.1f} ms = {medians['total_ms']:.1f} ms")
+    if first_response_budget is not None and medians["total_ms"] > first_response_budget:
+        failures.append(f"first response {medians['total_ms']:.1f} ms > {first_response_budget} ms")
+
+    for failure in failures:
+        print(f"over budget: {failure}")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", action="append", dest="modules", help="repeatable, defaults to the worker path")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules listed per import")
+    parser.add_argument("--path", default="/health-check/")
+    parser.add_argument("--max-import-ms", action="append", metavar="MODULE=MS")
+    parser.add_argument("--max-first-response-ms", type=float)
+    options = parser.parse_args()
+    ok = run(options.modules or DEFAULT_MODULES, options.rounds, options.top, options.path,
+             parse_budgets(options.max_import_ms), options.max_first_response_ms)
+    sys.exit(0 if ok else 1)
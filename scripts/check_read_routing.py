@@ -0,0 +1,94 @@
+"""
+Checks the read routing of mongo.routing against a replica set: listing reads of VendorCollection go to a secondary,
+find_one and writes to the primary, and a listing read inside a causal session waits for the session's writes.
+
+A local replica set is enough:
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 & mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 &
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "localhost:27017"},
+                                                      {_id: 1, host: "localhost:27018", priority: 0}]})'
+
+Usage:
+    python -m scripts.check_read_routing --connection-string "mongodb://localhost:27017/read_routing?replicaSet=rs0"
+"""
+import argparse
+import sys
+
+from pymongo import MongoClient, monitoring
+
+from mongo.collection import AdminVendorCollection, VendorCollection
+from mongo.enums import CountStrategy, ReadRoute
+from mongo.routing import causal_session
+from scripts.bench_codecs import get_vendor_document
+
+
+class ServerRecorder(monitoring.CommandListener):
+    """Server address and afterClusterTime of every command"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        after_cluster_time = event.command.get("readConcern", {}).get("afterClusterTime")
+        self.commands.append((event.command_name, event.connection_id, after_cluster_time))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self, command_name):
+        commands = [command for command in self.commands if command[0] == command_name]
+        self.commands = []
+        return commands
+
+
+def check(name, ok):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    return ok
+
+
+def run(connection_string):
+    recorder = ServerRecorder()
+    client = MongoClient(connection_string, event_listeners=[recorder])
+    vendors = VendorCollection(connection=client)
+    admin_vendors = AdminVendorCollection(connection=client)
+    vendors.collection.drop()
+    document = get_vendor_document(0)
+    document.update(businessCategory="VENUE", rating=1)
+    vendors.insert_one(document=document)
+    primary = client.primary
+    results = []
+
+    recorder.commands = []
+    list(vendors.aggregate(count_strategy=CountStrategy.NONE))
+    (_, server, _), = recorder.take("aggregate")
+    results.append(check(f"public listing read from a secondary ({server})", server != primary))
+
+    list(admin_vendors.aggregate(count_strategy=CountStrategy.NONE))
+    (_, server, _), = recorder.take("aggregate")
+    results.append(check(f"admin listing read from the primary ({server})", server == primary))
+
+    list(vendors.aggregate(count_strategy=CountStrategy.NONE, read_route=ReadRoute.PRIMARY))
+    (_, server, _), = recorder.take("aggregate")
+    results.append(check(f"read_route=PRIMARY on the call overrides the class ({server})", server == primary))
+
+    with causal_session(client):
+        vendors.update_one(filter={"vendorId": document["vendorId"]}, update={"name": "Renamed"})
+        vendors.find_one({"vendorId": document["vendorId"]})
+        (_, server, _), = recorder.take("find")
+        results.append(check(f"find_one after a write read from the primary ({server})", server == primary))
+        rows = list(vendors.aggregate(defaults=[{"vendorId": document["vendorId"]}],
+                                      count_strategy=CountStrategy.NONE))
+        (_, server, after_cluster_time), = recorder.take("aggregate")
+        results.append(check(f"listing in the session waits for its write ({server}, {after_cluster_time})",
+                             after_cluster_time is not None and rows and rows[0]["venueName"] == "Renamed"))
+    vendors.collection.drop()
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connection-string", default="mongodb://localhost:27017/read_routing?replicaSet=rs0")
+    options = parser.parse_args()
+    sys.exit(0 if run(options.connection_string) else 1)
@@ -1,6 +1,29 @@
-from .api import Api
-from .check_valid_uuid import is_valid_uuid
-from .generate_jwt_token import generate_access_refresh_token, encode_jwt, decode_jwt
-from .get_env import get_env_value
-from .mongo_connection import MONGO_CONNECTION, MONGO_CONNECTION_INHOUSE_SERVICES
+# Names are imported on first access (PEP 562), so `import utils` does not load jwt, Django or a Mongo client
+import importlib
 
+_exports = {
+    "Api": ".api",
+    "is_valid_uuid": ".check_valid_uuid",
+    "generate_access_refresh_token": ".generate_jwt_token",
+    "encode_jwt": ".generate_jwt_token",
+    "decode_jwt": ".generate_jwt_token",
+    "get_env_value": ".get_env",
+    "MONGO_CONNECTION": ".mongo_connection",
+    "MONGO_CONNECTION_INHOUSE_SERVICES": ".mongo_connection",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_exports})
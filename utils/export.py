@@ -0,0 +1,212 @@
+import csv
+import json
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+from .utils import flatten_nested
+
+EXPORT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+INVALID_XML_CHARACTERS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class Echo:
+    """File like object whose write returns what was written, for csv.writer inside a generator"""
+
+    def write(self, value):
+        return value
+
+
+class StreamBuffer:
+    """Write only file for zipfile, the written bytes are taken out with pop() after every chunk"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def get_cell_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def iter_flat_rows(rows, columns=None):
+    """
+    (columns, row values) for every row, columns come from the first row when not given. A given column that is
+    nested in the row, e.g. an address dict, is one json cell.
+    """
+    for document in rows:
+        row = flatten_nested(document)
+        if columns is None:
+            columns = list(row)
+        yield columns, [get_cell_value(row[column] if column in row else document.get(column)) for column in columns]
+
+
+def iter_chunks(parts, chunk_size=CHUNK_SIZE):
+    """Joins small pieces into chunks of about chunk_size, the first piece goes out on its own"""
+    buffer, size, first = [], 0, True
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if first or size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size, first = [], 0, False
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_csv(rows, columns=None):
+    writer = csv.writer(Echo())
+    header_written = False
+    for row_columns, values in iter_flat_rows(rows, columns):
+        if not header_written:
+            yield writer.writerow(row_columns).encode()
+            header_written = True
+        yield writer.writerow(values).encode()
+    if not header_written and columns:
+        yield writer.writerow(columns).encode()
+
+
+def get_xlsx_cell(value):
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    text = escape(INVALID_XML_CHARACTERS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def get_xlsx_row(values):
+    return "<row>" + "".join(get_xlsx_cell(value) for value in values) + "</row>"
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def iter_xlsx(rows, columns=None, chunk_size=CHUNK_SIZE):
+    """
+    Minimal single sheet workbook written as a zip stream: the sheet is deflated row by row and the compressed bytes
+    are yielded every chunk_size bytes of sheet xml, so memory does not grow with the number of rows.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        yield buffer.pop()
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            pending, header_written = 0, False
+            for row_columns, values in iter_flat_rows(rows, columns):
+                if not header_written:
+                    pending += sheet.write(get_xlsx_row(row_columns).encode())
+                    header_written = True
+                pending += sheet.write(get_xlsx_row(values).encode())
+                if pending >= chunk_size:
+                    pending = 0
+                    data = buffer.pop()
+                    if data:
+                        yield data
+            if not header_written and columns:
+                sheet.write(get_xlsx_row(columns).encode())
+            sheet.write(b"</sheetData></worksheet>")
+    yield buffer.pop()
+
+
+def get_streaming_response(chunks, filename, content_type):
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def csv_response(rows, filename, columns=None):
+    """rows is any iterator of documents, e.g. LeadsCollection.aggregate_excluding_limit(batch_size=...)"""
+    return get_streaming_response(iter_chunks(iter_csv(rows, columns)), filename, "text/csv")
+
+
+def xlsx_response(rows, filename, columns=None):
+    return get_streaming_response(iter_xlsx(rows, columns), filename, XLSX_CONTENT_TYPE)
+
+
+def iter_closing(chunks, rows):
+    """Closes rows when the response is closed, also when the client disconnects before the end"""
+    try:
+        yield from chunks
+    finally:
+        rows.close()
+
+
+def get_leads_export_columns(leads):
+    """The projected fields and the vendor assignments, so every export has the same columns whatever its rows"""
+    return [field for field, value in leads.get_vendor_projection().items() if value] + ["vl"]
+
+
+def leads_export_response(leads, *, defaults, sort_by=None, sort_key=None, file_format="csv", filename=None):
+    """Streams LeadsCollection.aggregate_excluding_limit as csv or xlsx, one cursor batch in memory at a time"""
+    rows = leads.aggregate_excluding_limit(
+        defaults=defaults, sort_by=sort_by, sort_key=sort_key, batch_size=EXPORT_BATCH_SIZE
+    ).prefetch(batch_size=EXPORT_BATCH_SIZE)
+    columns = get_leads_export_columns(leads)
+    filename = filename or f"leads.{file_format}"
+    if file_format == "xlsx":
+        return get_streaming_response(iter_closing(iter_xlsx(rows, columns), rows), filename, XLSX_CONTENT_TYPE)
+    return get_streaming_response(iter_closing(iter_chunks(iter_csv(rows, columns)), rows), filename, "text/csv")
@@ -1,12 +1,70 @@
-from HarperFoundation.utils.get_env import get_env_value
+import logging
+import os
+import threading
+import time
+
 from mongo import MongoDBClient
+from .get_env import get_env_value
+
+logger = logging.getLogger(__name__)
+
+
+class LazyMongoConnection:
+    """
+    MongoDBClient for the connection string in an environment variable, made on first use instead of at import.
+    Anything read from it is forwarded to that client, so it is passed as `connection=` like the client itself.
+    A forked worker makes its own client, warm() connects it ahead of the first request.
+    """
+
+    def __init__(self, env_name, client_class=MongoDBClient):
+        self.env_name = env_name
+        self.client_class = client_class
+        self._lock = threading.Lock()
+        self._client = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._client = None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.client_class.get_client(connection_string=get_env_value(self.env_name))
+        return self._client
+
+    @property
+    def is_connected(self):
+        return self._client is not None
+
+    def warm(self):
+        """Makes the client and waits for a server to answer, returns the seconds it took"""
+        started_at = time.perf_counter()
+        self.get().client.admin.command("ping")
+        elapsed = time.perf_counter() - started_at
+        logger.info("Mongo connection %s warmed in %.1f ms", self.env_name, elapsed * 1000)
+        return elapsed
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        return f"<LazyMongoConnection {self.env_name} {'connected' if self.is_connected else 'not connected'}>"
+
+
+MONGO_CONNECTION = LazyMongoConnection("CONNECTION_STRING")
 
-print("CONNECTION_STR", get_env_value("CONNECTION_STRING"))
+MONGO_CONNECTION_INHOUSE_SERVICES = LazyMongoConnection("CONNECTION_STRING_IN_HOUSE")
 
-MONGO_CONNECTION = MongoDBClient.get_client(
-    connection_string=get_env_value("CONNECTION_STRING")
-)
 
-MONGO_CONNECTION_INHOUSE_SERVICES = MongoDBClient.get_client(
-    connection_string=get_env_value("CONNECTION_STRING_IN_HOUSE")
-)
\ No newline at end of file
+def warm_connections(*connections):
+    """Warms the given connections, by default the ones whose variable is set, e.g. from a gunicorn post_fork hook"""
+    if not connections:
+        connections = [connection for connection in (MONGO_CONNECTION, MONGO_CONNECTION_INHOUSE_SERVICES)
+                       if connection.env_name in os.environ]
+    for connection in connections:
+        connection.warm()
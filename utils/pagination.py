@@ -1,12 +1,18 @@
 import os
 
-from rest_framework.utils.urls import replace_query_param
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 
 
 class PaginationUtils:
     def __init__(self, request):
         self.request = request
 
+    def _get_url(self, url):
+        url_suffix = url.split(self.request.path)
+
+        host = os.environ.get('HOST_URL', self.request.get_host())
+        return host + self.request.path + url_suffix[-1]
+
     def get_next_page_url(self, current_page: int = 0, limit: int = 10):
         next_page = current_page + 1
         url = self.request.build_absolute_uri()
@@ -14,7 +20,16 @@ class PaginationUtils:
         url = replace_query_param(url, 'limit', limit)
         url = replace_query_param(url, 'page', next_page)
 
-        url_suffix = url.split(self.request.path)
+        return self._get_url(url)
 
-        host = os.environ.get('HOST_URL', self.request.get_host())
-        return host + self.request.path + url_suffix[-1]
+    def get_next_cursor_url(self, cursor: str = None, limit: int = 10):
+        """Next page url for keyset pagination, `cursor` is QueryIterator.next_cursor (None on the last page)"""
+        if not cursor:
+            return None
+        url = self.request.build_absolute_uri()
+
+        url = replace_query_param(url, 'limit', limit)
+        url = replace_query_param(url, 'cursor', cursor)
+        url = remove_query_param(url, 'page')
+
+        return self._get_url(url)
@@ -0,0 +1,100 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from mongo.collection import QueryIterator
+from utils.export import iter_chunks, iter_csv, iter_xlsx, leads_export_response
+
+ROWS = [
+    {"leadId": "l1", "clientName": "Asha", "eventDate": datetime(2024, 5, 1, tzinfo=timezone.utc),
+     "clientAddress": {"city": "Pune"}, "initialOrderValue": Decimal("1500.50"), "vl": [{"vendorName": "V"}]},
+    {"leadId": "l2", "clientName": "R&D <Co>", "clientAddress": {"city": "Goa", "pin": "403001"}},
+]
+
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+
+
+def read_xlsx(chunks):
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as workbook:
+        return workbook.read("xl/worksheets/sheet1.xml").decode()
+
+
+class CsvTest(SimpleTestCase):
+
+    def test_columns_of_the_first_row(self):
+        lines = read_csv(iter_csv(iter(ROWS)))
+        self.assertEqual(lines[0], ["leadId", "clientName", "eventDate", "clientAddress.city", "initialOrderValue",
+                                    "vl"])
+        self.assertEqual(lines[1], ["l1", "Asha", "2024-05-01T00:00:00+00:00", "Pune", "1500.50",
+                                    '[{"vendorName": "V"}]'])
+        self.assertEqual(lines[2], ["l2", "R&D <Co>", "", "Goa", "", ""])
+
+    def test_given_columns(self):
+        lines = read_csv(iter_csv(iter(ROWS), ["leadId", "clientAddress", "clientMobile"]))
+        self.assertEqual(lines, [
+            ["leadId", "clientAddress", "clientMobile"],
+            ["l1", '{"city": "Pune"}', ""],
+            ["l2", '{"city": "Goa", "pin": "403001"}', ""],
+        ])
+
+    def test_header_without_rows(self):
+        self.assertEqual(read_csv(iter_csv(iter([]), ["leadId"])), [["leadId"]])
+        self.assertEqual(read_csv(iter_csv(iter([]))), [])
+
+    def test_chunks(self):
+        chunks = list(iter_chunks(iter_csv(iter(ROWS * 100)), chunk_size=1024))
+        # the header goes out on its own, so the response starts before the first batch is read
+        self.assertEqual(read_csv(chunks[:1])[0][0], "leadId")
+        self.assertTrue(all(len(chunk) >= 1024 for chunk in chunks[1:-1]))
+        self.assertEqual(len(read_csv(chunks)), 201)
+
+
+class XlsxTest(SimpleTestCase):
+
+    def test_workbook(self):
+        sheet = read_xlsx(iter_xlsx(iter(ROWS), ["leadId", "clientName", "initialOrderValue"]))
+        self.assertEqual(len(re.findall("<row>", sheet)), 3)
+        self.assertIn('<t xml:space="preserve">R&amp;D &lt;Co&gt;</t>', sheet)
+        self.assertIn("<c><v>1500.50</v></c>", sheet)
+
+    def test_streams_while_writing(self):
+        chunks = list(iter_xlsx(iter(ROWS * 2000), chunk_size=4096))
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(len(re.findall("<row>", read_xlsx(chunks))), 4001)
+
+
+class Leads:
+
+    def __init__(self, rows):
+        self.rows = QueryIterator(iter(rows))
+
+    def get_vendor_projection(self):
+        return {"_id": 0, "leadId": 1, "clientName": 1, "clientMobile": 1}
+
+    def aggregate_excluding_limit(self, **kwargs):
+        return self.rows
+
+
+class LeadsExportResponseTest(SimpleTestCase):
+
+    def test_csv_columns_of_the_projection(self):
+        leads = Leads([{"leadId": "l1", "vl": []}, {"leadId": "l2", "clientMobile": "99"}])
+        response = leads_export_response(leads, defaults=[])
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="leads.csv"')
+        self.assertEqual(read_csv(response.streaming_content), [
+            ["leadId", "clientName", "clientMobile", "vl"], ["l1", "", "", "[]"], ["l2", "", "99", ""]
+        ])
+
+    def test_rows_are_closed(self):
+        leads = Leads([{"leadId": "l1"}])
+        response = leads_export_response(leads, defaults=[], file_format="xlsx")
+        self.assertIn("<row>", read_xlsx(response.streaming_content))
+        self.assertTrue(leads.rows._prefetcher._stop.is_set())